@@ -7,18 +7,25 @@ import pandas as pd
 import plotly.express as px
 import streamlit as st
 from pathlib import Path
+from typing import Optional
 
+from tourboard.pool import ConnectionPool
 from tourboard.db import (
-    get_conn,
-    init_db,
     upsert_events,
     insert_snapshot,
     read_latest_events,
     read_snapshots,
 )
 from tourboard.scraping import scrape_all, SOURCE_URL
-from tourboard.transforms import country_rollup, format_money, format_int, format_price
-from tourboard.geocode import geocode_city_country
+from tourboard.transforms import format_money, format_int, format_price
+from tourboard.dates import add_run_dates
+from tourboard.gazetteer import place_key
+from tourboard.geocache import GeocacheStore
+from tourboard.geocode import coordinates_frame, fill_coordinates
+from tourboard.geoworker import GeocodeWorker
+from tourboard.history import rollup_series
+from tourboard.metrics import TourMetrics, stop_status, tour_metrics
+from tourboard.storage import data_version, load_events
 
 
 st.set_page_config(page_title="DTMF Tourboard", layout="wide")
@@ -153,10 +160,22 @@ st.markdown(
     unsafe_allow_html=True,
 )
 
-conn = get_conn()
-init_db(conn)
-from tourboard.db import ensure_snapshots_schema
-ensure_snapshots_schema(conn)
+# One pool per server process: schema setup runs once, not on every rerun
+@st.cache_resource
+def get_pool() -> ConnectionPool:
+    return ConnectionPool()
+
+pool = get_pool()
+
+# Geocache front (LRU + one IN query) shared by every session and the
+# background geocoder, which looks up the places the updater could not place
+@st.cache_resource
+def get_geocache() -> GeocacheStore:
+    return GeocacheStore()
+
+@st.cache_resource
+def get_geocoder() -> GeocodeWorker:
+    return GeocodeWorker(store=get_geocache())
 
 
 
@@ -164,52 +183,47 @@ ensure_snapshots_schema(conn)
 import pandas as pd
 from pathlib import Path
 
-EVENTS_CSV = Path("data/events_latest.csv")
-SNAPS_CSV = Path("data/snapshots.csv")
+# Only the columns the dashboard uses are loaded
+EVENT_COLUMNS = [
+    "region", "date_range", "start_date", "end_date", "venue", "city", "country",
+    "gross_usd", "tickets", "capacity_pct", "shows", "scraped_at", "lat", "lon",
+]
+
+# Everything derived from the events is memoised on the data version: a
+# token for the published file that changes when the updater publishes, so
+# widget reruns reuse the frames and figures and a publish invalidates them.
+# max_entries=2 keeps the current version and the one being replaced.
+data_ver = data_version()
+
+
+# Typed per tourboard.schema (categorical labels, nullable ints, parsed dates);
+# read from the Arrow file the updater publishes when present
+@st.cache_data(max_entries=2, show_spinner=False)
+def load_dashboard_events(version: Optional[str]) -> Optional[pd.DataFrame]:
+    events = load_events(columns=EVENT_COLUMNS)
+    if events is None:
+        return None
+    # start_dt / end_dt from the stored ISO dates (older files: parsed from date_range)
+    return add_run_dates(events)
 
-if not EVENTS_CSV.exists():
+events = load_dashboard_events(data_ver)
+if events is None:
     st.error("Data file not found yet. The admin needs to run the updater.")
     st.stop()
 
-events = pd.read_csv(EVENTS_CSV)
-snaps = pd.read_csv(SNAPS_CSV) if SNAPS_CSV.exists() else pd.DataFrame()
-
-
-for col in ["gross_usd", "tickets", "shows", "capacity_pct"]:
-    if col in events.columns:
-        events[col] = pd.to_numeric(events[col], errors="coerce")
-
-
 
-# Compute headline metrics from the latest events scrape (more reliable than header parsing)
-events_num = events.copy()
 
-# force numeric
-events_num["gross_usd"] = pd.to_numeric(events_num["gross_usd"], errors="coerce")
-events_num["tickets"] = pd.to_numeric(events_num["tickets"], errors="coerce")
-events_num["shows"] = pd.to_numeric(events_num["shows"], errors="coerce")
-
-# totals from event rows (ignores TBA)
-reported_revenue = float(events_num["gross_usd"].dropna().sum()) if events_num["gross_usd"].notna().any() else None
-reported_tickets = int(events_num["tickets"].dropna().sum()) if events_num["tickets"].notna().any() else None
-
-avg_price = (reported_revenue / reported_tickets) if (reported_revenue is not None and reported_tickets not in (None, 0)) else None
-
-# shows (optional but good)
-total_shows = int(events_num["shows"].fillna(0).sum()) if "shows" in events_num.columns else 0
-reported_shows = int(events_num.loc[events_num["gross_usd"].notna(), "shows"].fillna(0).sum()) if "shows" in events_num.columns else 0
-
-total_reports_text = f"{reported_shows} / {total_shows} shows reported"
+# Headline KPIs, tour status and per-country aggregates (tourboard.metrics:
+# one pass over the events), cached with the data
+from datetime import date
 
-#total countries
-total_countries = events.loc[events["gross_usd"].notna(), "country"].dropna().nunique()
+today_iso = date.today().isoformat()
 
+@st.cache_data(max_entries=2, show_spinner=False)
+def dashboard_metrics(version: Optional[str], today_iso: str) -> TourMetrics:
+    return tour_metrics(load_dashboard_events(version), pd.Timestamp(today_iso))
 
-# Last update timestamp (from latest scrape)
-if "scraped_at" in events.columns and events["scraped_at"].notna().any():
-    last_updated = events["scraped_at"].max()
-else:
-    last_updated = None
+metrics = dashboard_metrics(data_ver, today_iso)
 
 
 #next stop
@@ -227,150 +241,16 @@ def country_to_flag(country_name: str) -> str:
     except Exception:
         return "🏳️"
 
-from datetime import datetime, date
-import re
-
-def _month_to_num(m: str) -> int:
-    m = m.strip().replace(".", "")
-    # accept full or abbreviated month names
-    try:
-        return datetime.strptime(m[:3], "%b").month
-    except Exception:
-        return datetime.strptime(m, "%B").month
-
-def parse_start_date(date_range: str):
-    """
-    Returns a datetime.date for the FIRST day of the run.
-    Handles:
-      - "November 21-22, 2025"
-      - "December 10-21, 2025"
-      - "February 28-Mar. 1, 2026"
-      - "July 1, 2026"
-    """
-    if not date_range:
-        return None
-
-    s = date_range.strip()
-
-    # Cross-month: "Feb 28-Mar. 1, 2026"
-    m = re.match(r"^([A-Za-z]{3,}\.?)\s+(\d{1,2})-([A-Za-z]{3,}\.?)\s+(\d{1,2}),\s*(\d{4})$", s)
-    if m:
-        m1, d1, m2, d2, y = m.groups()
-        return date(int(y), _month_to_num(m1), int(d1))
-
-    # Same-month range or single date: "November 21-22, 2025" or "July 1, 2026"
-    m = re.match(r"^([A-Za-z]{3,}\.?)\s+(\d{1,2})(?:-\d{1,2})?,\s*(\d{4})$", s)
-    if m:
-        mon, d1, y = m.groups()
-        return date(int(y), _month_to_num(mon), int(d1))
-
-    return None
-
-#date range parser para banner
-
-from datetime import date, datetime, timedelta
-import re
-
-def _month_to_num(m: str) -> int:
-    m = m.strip().replace(".", "")
-    return datetime.strptime(m[:3], "%b").month
-
-def parse_date_range(date_range: str):
-    """
-    Returns (start_date, end_date) as datetime.date
-    Handles:
-      - "November 21-22, 2025"
-      - "December 10-21, 2025"
-      - "February 28-Mar. 1, 2026"
-      - "July 1, 2026"
-    """
-    if not date_range:
-        return (None, None)
-
-    s = date_range.strip()
-
-    # Cross-month: "Feb 28-Mar. 1, 2026"
-    m = re.match(r"^([A-Za-z]{3,}\.?)\s+(\d{1,2})-([A-Za-z]{3,}\.?)\s+(\d{1,2}),\s*(\d{4})$", s)
-    if m:
-        m1, d1, m2, d2, y = m.groups()
-        y = int(y)
-        start = date(y, _month_to_num(m1), int(d1))
-        end = date(y, _month_to_num(m2), int(d2))
-        return (start, end)
-
-    # Same-month range: "November 21-22, 2025" or single "July 1, 2026"
-    m = re.match(r"^([A-Za-z]{3,}\.?)\s+(\d{1,2})(?:-(\d{1,2}))?,\s*(\d{4})$", s)
-    if m:
-        mon, d1, d2, y = m.groups()
-        y = int(y)
-        start = date(y, _month_to_num(mon), int(d1))
-        end = date(y, _month_to_num(mon), int(d2)) if d2 else start
-        return (start, end)
-
-    return (None, None)
-
-
-# --- Next Stop (upcoming, not yet reported) ---
-from datetime import date
-
-today = date.today()
-
-status_df = events.copy()
-status_df[["start_dt", "end_dt"]] = status_df["date_range"].apply(
-    lambda s: pd.Series(parse_date_range(s))
-)
-
-# Current stop = any run where today is within [start_dt, end_dt]
-current = status_df[
-    status_df["start_dt"].notna() &
-    status_df["end_dt"].notna() &
-    (status_df["start_dt"] <= today) &
-    (today <= status_df["end_dt"])
-].sort_values("start_dt").head(1)
-
-current_data = current.iloc[0].to_dict() if not current.empty else None
-
-# Next stop = earliest run whose start_dt is in the future
-next_run = status_df[
-    status_df["start_dt"].notna() &
-    (status_df["start_dt"] > today)
-].sort_values("start_dt").head(1)
-
-next_data = next_run.iloc[0].to_dict() if not next_run.empty else None
-
-# Choose banner mode/data
-if current_data:
+# Current stop = any run where today is within [start_dt, end_dt]; else the next one
+if metrics.current_stop:
     banner_mode = "current"
-    banner_data = current_data
+    banner_data = metrics.current_stop
 else:
     banner_mode = "next"
-    banner_data = next_data
-
-
-from datetime import date
-
-# --- Latest report available (most recent stop with gross reported) ---
-reports_df = events.copy()
-reports_df["gross_usd"] = pd.to_numeric(reports_df["gross_usd"], errors="coerce")
-reports_df["tickets"] = pd.to_numeric(reports_df["tickets"], errors="coerce")
+    banner_data = metrics.next_stop
 
-reports_df[["start_dt", "end_dt"]] = reports_df["date_range"].apply(
-    lambda s: pd.Series(parse_date_range(s))
-)
-
-reported = reports_df[
-    reports_df["gross_usd"].notna()
-    & reports_df["tickets"].notna()
-    & reports_df["start_dt"].notna()
-].copy()
-
-# pick the most recent *reported* stop by end date (fallback start date)
-if not reported.empty:
-    reported["sort_dt"] = reported["end_dt"].fillna(reported["start_dt"])
-    latest_report = reported.sort_values("sort_dt", ascending=False).head(1)
-    latest_report_data = latest_report.iloc[0].to_dict()
-else:
-    latest_report_data = None
+# Latest report available (most recent stop with gross reported)
+latest_report_data = metrics.latest_report
 
 
 
@@ -378,29 +258,29 @@ else:
 c1, c2, c3, c4, c5 = st.columns(5)
 with c1:
     st.markdown(
-        f'<div class="tb-card"><div class="tb-badge">TOTAL REVENUE</div><div class="tb-metric">{format_money(reported_revenue)}</div><div class="tb-muted">reported</div></div>',
+        f'<div class="tb-card"><div class="tb-badge">TOTAL REVENUE</div><div class="tb-metric">{format_money(metrics.reported_revenue)}</div><div class="tb-muted">reported</div></div>',
         unsafe_allow_html=True,
     )
 with c2:
     st.markdown(
-        f'<div class="tb-card"><div class="tb-badge">TOTAL TICKETS SOLD</div><div class="tb-metric">{format_int(reported_tickets)}</div><div class="tb-muted">reported</div></div>',
+        f'<div class="tb-card"><div class="tb-badge">TOTAL TICKETS SOLD</div><div class="tb-metric">{format_int(metrics.reported_tickets)}</div><div class="tb-muted">reported</div></div>',
         unsafe_allow_html=True,
     )
 
 with c3:
     st.markdown(
-        f'<div class="tb-card"><div class="tb-badge">AVG TICKET PRICE</div><div class="tb-metric">{format_price(avg_price)}</div><div class="tb-muted">derived</div></div>',
+        f'<div class="tb-card"><div class="tb-badge">AVG TICKET PRICE</div><div class="tb-metric">{format_price(metrics.avg_price)}</div><div class="tb-muted">derived</div></div>',
         unsafe_allow_html=True,
     )
 with c4:
     st.markdown(
-        f'<div class="tb-card"><div class="tb-badge">REPORTED SHOWS</div><div class="tb-metric">{reported_shows}</div><div class="tb-muted">{total_reports_text}</div></div>',
+        f'<div class="tb-card"><div class="tb-badge">REPORTED SHOWS</div><div class="tb-metric">{metrics.reported_shows}</div><div class="tb-muted">{metrics.total_reports_text}</div></div>',
         unsafe_allow_html=True,
     )
 
 with c5:
     st.markdown(
-        f'<div class="tb-card"><div class="tb-badge">TOTAL COUNTRIES VISITED</div><div class="tb-metric">{total_countries}</div><div class="tb-muted">tour stops</div></div>',
+        f'<div class="tb-card"><div class="tb-badge">TOTAL COUNTRIES VISITED</div><div class="tb-metric">{metrics.total_countries}</div><div class="tb-muted">tour stops</div></div>',
         unsafe_allow_html=True,
     )
     
@@ -572,211 +452,191 @@ with st.expander("🗓️ Complete Tour Dates", expanded=False):
     st.dataframe(view, use_container_width=True, hide_index=True)
 
 
-# --- Country rollup used by charts (roll) ---
-roll = (
-    events.dropna(subset=["country"])
-    .groupby(["country"], as_index=False)
-    .agg(
-        gross_usd=("gross_usd", "sum"),
-        tickets=("tickets", "sum"),
-        shows=("shows", "sum"),
-    )
-)
-
-# Avoid zeros becoming weird in charts
-roll.loc[roll["gross_usd"] == 0, "gross_usd"] = pd.NA
-roll.loc[roll["tickets"] == 0, "tickets"] = pd.NA
-
+# --- Country charts: built once per data version ---
+@st.cache_data(max_entries=2, show_spinner=False)
+def country_charts(version: Optional[str], today_iso: str) -> dict:
+    # per-country sums and ratios from the metrics pass
+    countries = dashboard_metrics(version, today_iso).countries
 
-    
-st.markdown("### 📊 Charts")
-
-tix_df = roll.dropna(subset=["gross_usd"]).copy()
-tix_df = tix_df[tix_df["gross_usd"] > 0].sort_values("gross_usd", ascending=True)
-
-tix_df["gross_M"] = (tix_df["gross_usd"] / 1_000_000).round(0)
-tix_df["gross_label"] = "$"+ tix_df["gross_M"].astype(int).astype(str) + "M"
+    tix_df = countries.dropna(subset=["gross_usd"])
+    tix_df = tix_df[tix_df["gross_usd"] > 0].sort_values("gross_usd", ascending=True)
 
+    tix_df["gross_M"] = (tix_df["gross_usd"] / 1_000_000).round(0)
+    tix_df["gross_label"] = "$"+ tix_df["gross_M"].astype(int).astype(str) + "M"
 
-fig_tix = px.bar(
-       
-    tix_df,
-    x="gross_usd",
-    y="country",
-    orientation="h",
-    title="Reported Revenue Generated by Country",
-)
-fig_tix.update_layout(margin=dict(l=0, r=90, t=60, b=0))
-
-max_x = tix_df["gross_usd"].max()
-fig_tix.update_xaxes(range=[0, max_x * 1.15])
 
+    fig_tix = px.bar(
 
-fig_tix.update_traces(
-    text=tix_df["gross_label"],
-    textposition="outside",
-    hovertemplate="$%{x:,.0f}<extra></extra>",
-    cliponaxis=False,
-)
+        tix_df,
+        x="gross_usd",
+        y="country",
+        orientation="h",
+        title="Reported Revenue Generated by Country",
+    )
+    fig_tix.update_layout(margin=dict(l=0, r=90, t=60, b=0))
 
+    max_x = tix_df["gross_usd"].max()
+    fig_tix.update_xaxes(range=[0, max_x * 1.15])
 
-st.plotly_chart(fig_tix, use_container_width=True, config={"responsive": True})
 
+    fig_tix.update_traces(
+        text=tix_df["gross_label"],
+        textposition="outside",
+        hovertemplate="$%{x:,.0f}<extra></extra>",
+        cliponaxis=False,
+    )
 
 
+    # --- Revenue per show by country (efficiency) ---
 
-# --- Revenue per show by country (efficiency) ---
+    # only countries with reported gross and shows
+    rps_agg = countries.dropna(subset=["revenue_per_show_usd"])
 
-rps_df = events.copy()
-rps_df["gross_usd"] = pd.to_numeric(rps_df["gross_usd"], errors="coerce")
-rps_df["shows"] = pd.to_numeric(rps_df["shows"], errors="coerce")
+    # sort DESCENDING (largest first)
+    rps_agg = rps_agg.sort_values("revenue_per_show_usd", ascending=False)
 
-# keep only reported rows with valid shows
-rps_df = rps_df.dropna(subset=["country", "gross_usd", "shows"])
-rps_df = rps_df[(rps_df["gross_usd"] > 0) & (rps_df["shows"] > 0)]
+    # label in millions
+    rps_agg["rps_M"] = (rps_agg["revenue_per_show_usd"] / 1_000_000).round(1)
+    rps_agg["rps_label"] = "$" + rps_agg["rps_M"].astype(str) + "M"
 
-rps_agg = (
-    rps_df.groupby("country", as_index=False)
-    .agg(
-        reported_gross_usd=("gross_usd", "sum"),
-        reported_shows=("shows", "sum"),
+    fig_rps = px.bar(
+        rps_agg,
+        x="revenue_per_show_usd",
+        y="country",
+        orientation="h",
+        title="Revenue per show by country",
     )
-)
-
-rps_agg["revenue_per_show_usd"] = rps_agg["reported_gross_usd"] / rps_agg["reported_shows"]
-
-# sort DESCENDING (largest first)
-rps_agg = rps_agg.sort_values("revenue_per_show_usd", ascending=False)
-
-# label in millions
-rps_agg["rps_M"] = (rps_agg["revenue_per_show_usd"] / 1_000_000).round(1)
-rps_agg["rps_label"] = "$" + rps_agg["rps_M"].astype(str) + "M"
-
-fig_rps = px.bar(
-    rps_agg,
-    x="revenue_per_show_usd",
-    y="country",
-    orientation="h",
-    title="Revenue per show by country",
-)
 
-# put biggest at the top
-fig_rps.update_yaxes(categoryorder="array", categoryarray=list(rps_agg["country"])[::-1])
-fig_rps.update_layout(margin=dict(l=0, r=90, t=60, b=0))
-
-max_x = rps_agg["revenue_per_show_usd"].max()
-fig_rps.update_xaxes(range=[0, max_x * 1.15])
-
-fig_rps.update_traces(
-    text=rps_agg["rps_label"],
-    textposition="outside",
-    hovertemplate=(
-        "Revenue/show: $%{x:,.0f}"
-        "<br>Reported shows: %{customdata[0]}"
-        "<br>Total reported gross: $%{customdata[1]:,.0f}"
-        "<extra></extra>"
-    ),
-    customdata=rps_agg[["reported_shows", "reported_gross_usd"]].to_numpy(),
-    cliponaxis=False,
-)
+    # put biggest at the top
+    fig_rps.update_yaxes(categoryorder="array", categoryarray=list(rps_agg["country"])[::-1])
+    fig_rps.update_layout(margin=dict(l=0, r=90, t=60, b=0))
+
+    max_x = rps_agg["revenue_per_show_usd"].max()
+    fig_rps.update_xaxes(range=[0, max_x * 1.15])
+
+    fig_rps.update_traces(
+        text=rps_agg["rps_label"],
+        textposition="outside",
+        hovertemplate=(
+            "Revenue/show: $%{x:,.0f}"
+            "<br>Reported shows: %{customdata[0]}"
+            "<br>Total reported gross: $%{customdata[1]:,.0f}"
+            "<extra></extra>"
+        ),
+        customdata=rps_agg[["rps_shows", "rps_gross_usd"]].to_numpy(),
+        cliponaxis=False,
+    )
 
-st.plotly_chart(fig_rps, use_container_width=True, config={"responsive": True})
 
+    #Tickets sold by country
 
 
+    tix_df = countries.dropna(subset=["tickets"])
+    tix_df = tix_df[tix_df["tickets"] > 0].sort_values("tickets", ascending=True)
 
-#Tickets sold by country
+    tix_df["tickets_K"] = (tix_df["tickets"] / 1_000).round(0)
+    tix_df["tickets_label"] = tix_df["tickets_K"].astype(int).astype(str) + "K"
 
 
-tix_df = roll.dropna(subset=["tickets"]).copy()
-tix_df = tix_df[tix_df["tickets"] > 0].sort_values("tickets", ascending=True)
+    fig_tickets = px.bar(
+        tix_df,
+        x="tickets",
+        y="country",
+        orientation="h",
+        title="Reported Tickets Sold by Country",
+    )
 
-tix_df["tickets_K"] = (tix_df["tickets"] / 1_000).round(0)
-tix_df["tickets_label"] = tix_df["tickets_K"].astype(int).astype(str) + "K"
 
+    fig_tickets.update_layout(margin=dict(l=0, r=90, t=60, b=0))
 
-fig_tix = px.bar(
-    tix_df,
-    x="tickets",
-    y="country",
-    orientation="h",
-    title="Reported Tickets Sold by Country",
-)
-    
-    
-fig_tix.update_layout(margin=dict(l=0, r=90, t=60, b=0))
+    max_x = tix_df["tickets"].max()
+    fig_tickets.update_xaxes(range=[0, max_x * 1.15])
 
-max_x = tix_df["tickets"].max()
-fig_tix.update_xaxes(range=[0, max_x * 1.15])
 
+    fig_tickets.update_traces(
+        text=tix_df["tickets_label"],
+        textposition="outside",
+        hovertemplate="$%{x:,.0f}<extra></extra>",
+        cliponaxis=False,
+    )
 
-fig_tix.update_traces(
-    text=tix_df["tickets_label"],
-    textposition="outside",
-    hovertemplate="$%{x:,.0f}<extra></extra>",
-    cliponaxis=False,
-)
-    
 
+     # ===============================
+    # Avg Ticket Price by Country
+    # ===============================
 
+    # Only countries with reported gross and tickets
+    city_roll = countries.dropna(subset=["avg_price_usd"])
 
-st.plotly_chart(fig_tix, use_container_width=True, config={"responsive": True})
+    # 🔑 SORT DESCENDING
+    city_roll = city_roll.sort_values("avg_price_usd", ascending=False)
 
+    fig_city_price = px.bar(
+        city_roll,
+        x="avg_price_usd",
+        y="country",
+        orientation="h",
+        title="Avg. Ticket Price by Country",
+    )
 
- # ===============================
-# Avg Ticket Price by Country
-# ===============================
+    # 🔑 Force biggest to show on top
+    fig_city_price.update_yaxes(
+        categoryorder="array",
+        categoryarray=list(city_roll["country"])[::-1]
+    )
 
-city_df = events.copy()
-city_df["gross_usd"] = pd.to_numeric(city_df["gross_usd"], errors="coerce")
-city_df["tickets"] = pd.to_numeric(city_df["tickets"], errors="coerce")
+    fig_city_price.update_layout(margin=dict(l=0, r=90, t=60, b=0))
 
-# Keep only rows with reported data
-city_df = city_df.dropna(subset=["gross_usd", "tickets", "country"])
-city_df = city_df[city_df["tickets"] > 0]
+    max_x = city_roll["avg_price_usd"].max()
+    fig_city_price.update_xaxes(range=[0, max_x * 1.15])
 
-# Aggregate by country
-city_roll = (
-    city_df.groupby("country", as_index=False)
-    .agg(
-        gross_usd=("gross_usd", "sum"),
-        tickets=("tickets", "sum"),
+    fig_city_price.update_traces(
+        texttemplate="$%{x:,.0f}",
+        textposition="outside",
+        hovertemplate="$%{x:,.2f}<extra></extra>",
+        cliponaxis=False,
     )
-)
 
-# Compute Avg Price
-city_roll["avg_price_usd"] = city_roll["gross_usd"] / city_roll["tickets"]
+    return {"revenue": fig_tix, "per_show": fig_rps, "tickets": fig_tickets, "avg_price": fig_city_price}
 
-# 🔑 SORT DESCENDING
-city_roll = city_roll.sort_values("avg_price_usd", ascending=False)
 
-fig_city_price = px.bar(
-    city_roll,
-    x="avg_price_usd",
-    y="country",
-    orientation="h",
-    title="Avg. Ticket Price by Country",
-)
-
-# 🔑 Force biggest to show on top
-fig_city_price.update_yaxes(
-    categoryorder="array",
-    categoryarray=list(city_roll["country"])[::-1]
-)
+# --- Reported revenue over time (per-scrape rollups, only if history was recorded) ---
+# History is written by the updater (--db) and by backfills, which do not
+# republish; the ttl picks those up
+@st.cache_data(max_entries=2, ttl="10m", show_spinner=False)
+def revenue_history_chart(version: Optional[str]):
+    with get_pool().reader() as conn:
+        gross_hist = rollup_series(conn, "tour")
+    if gross_hist["scraped_at"].nunique() <= 1:
+        return None
+    # tours are scraped at different times: carry each tour's last total
+    # forward to every scrape, then add the tours up
+    gross_hist = (
+        gross_hist.pivot_table(index="scraped_at", columns="source_url", values="gross_usd", aggfunc="last")
+        .sort_index()
+        .ffill()
+        .sum(axis=1, min_count=1)
+        .rename("gross_usd")
+        .reset_index()
+    )
+    gross_hist["scraped_at"] = pd.to_datetime(gross_hist["scraped_at"], errors="coerce")
+    fig_hist = px.line(gross_hist, x="scraped_at", y="gross_usd", markers=True, title="Reported Revenue Over Time")
+    fig_hist.update_traces(hovertemplate="%{x|%b %d, %Y}<br>$%{y:,.0f}<extra></extra>")
+    fig_hist.update_layout(margin=dict(l=0, r=20, t=60, b=0), xaxis_title=None, yaxis_title=None)
+    return fig_hist
 
-fig_city_price.update_layout(margin=dict(l=0, r=90, t=60, b=0))
 
-max_x = city_roll["avg_price_usd"].max()
-fig_city_price.update_xaxes(range=[0, max_x * 1.15])
+st.markdown("### 📊 Charts")
 
-fig_city_price.update_traces(
-    texttemplate="$%{x:,.0f}",
-    textposition="outside",
-    hovertemplate="$%{x:,.2f}<extra></extra>",
-    cliponaxis=False,
-)
+charts = country_charts(data_ver, today_iso)
+fig_hist = revenue_history_chart(data_ver)
 
-st.plotly_chart(fig_city_price, use_container_width=True, config={"responsive": True})
+st.plotly_chart(charts["revenue"], use_container_width=True, config={"responsive": True})
+if fig_hist is not None:
+    st.plotly_chart(fig_hist, use_container_width=True, config={"responsive": True})
+st.plotly_chart(charts["per_show"], use_container_width=True, config={"responsive": True})
+st.plotly_chart(charts["tickets"], use_container_width=True, config={"responsive": True})
+st.plotly_chart(charts["avg_price"], use_container_width=True, config={"responsive": True})
 
 
 
@@ -786,14 +646,20 @@ st.plotly_chart(fig_city_price, use_container_width=True, config={"responsive":
 st.subheader("🔥Songs played in the tour")
 
 songs_path = Path("data/songs_played.csv")
-if songs_path.exists():
+
+@st.cache_data(max_entries=2, show_spinner=False)
+def load_songs(mtime_ns: int) -> pd.DataFrame:
     songs_df = pd.read_csv(songs_path)
     songs_df["plays"] = pd.to_numeric(songs_df["plays"], errors="coerce").fillna(0).astype(int)
     songs_df["song"] = songs_df["song"].astype(str)
+    return songs_df.sort_values("plays", ascending=False)
+
+if songs_path.exists():
+    songs_df = load_songs(songs_path.stat().st_mtime_ns)
 
     q = st.text_input("Search song", "").strip().lower()
 
-    view = songs_df.sort_values("plays", ascending=False)
+    view = songs_df
     if q:
         view = view[view["song"].str.lower().str.contains(q, na=False)]
 
@@ -814,118 +680,122 @@ else:
 
 
 # =========================
-# Prepare map points (ensure lat/lon exist)
+# Prepare map points (precomputed lat/lon)
 # =========================
 
-points = events.copy()
+# Coordinates are attached by the updater (scripts/update_data.py). Places
+# it could not place (or a file published before it geocoded) go to the
+# background geocoder; the map draws what is known now and fills in the
+# rest as the worker resolves it, never waiting on the provider.
+geocoder = get_geocoder()
 
-# Status: reported vs pending
-from datetime import date
 
-today = date.today()
+@st.cache_data(max_entries=2, show_spinner=False)
+def map_points(version: Optional[str], today_iso: str) -> pd.DataFrame:
+    points = load_dashboard_events(version).copy()
 
-# Parse start / end dates from date_range
-points[["start_dt", "end_dt"]] = points["date_range"].apply(
-    lambda s: pd.Series(parse_date_range(s))
-)
+    # Status: reported vs pending
+    points["status"] = stop_status(points, pd.Timestamp(today_iso))
 
-def tour_status(row):
-    if row["start_dt"] and row["end_dt"]:
-        if row["start_dt"] <= today <= row["end_dt"]:
-            return "Current stop"
-        elif row["end_dt"] < today:
-            return "Happened"
-    return "Upcoming"
+    if "lat" not in points.columns or points["lat"].isna().any():
+        # whatever the geocache already knows: from memory, else one query
+        unplaced = points.loc[points["lat"].isna(), ["city", "country"]] if "lat" in points.columns else points[["city", "country"]]
+        keys = [place_key(c, k) for c, k in unplaced.dropna().drop_duplicates().itertuples(index=False, name=None)]
+        with get_pool().reader() as conn:
+            points = fill_coordinates(points, get_geocache().get_frame(conn, keys))
 
-points["status"] = points.apply(tour_status, axis=1)
+    # Hover display helpers
+    points["gross_display"] = points["gross_usd"].apply(format_money)
+    points["tickets_display"] = points["tickets"].apply(format_int)
+    return points
 
 
+points = map_points(data_ver, today_iso)
+missing = points.loc[points["lat"].isna(), ["city", "country"]].dropna().drop_duplicates()
+geocoder.submit(missing.itertuples(index=False, name=None))
 
-# Create lat/lon columns
-points["lat"] = pd.NA
-points["lon"] = pd.NA
-
-# Geocode unique city-country pairs (cached in SQLite)
-unique_places = (
-    points[["city", "country"]]
-    .dropna()
-    .drop_duplicates()
-    .values
-)
-
-for city, country in unique_places:
-    res = geocode_city_country(conn, city, country)
-    if res:
-        lat, lon = res
-        mask = (points["city"] == city) & (points["country"] == country)
-        points.loc[mask, "lat"] = lat
-        points.loc[mask, "lon"] = lon
-
-# Keep only rows with coordinates
-points = points.dropna(subset=["lat", "lon"]).copy()
+st.markdown("## 🌍🎤 Tour Map")
 
-# Hover display helpers
-points["gross_display"] = points["gross_usd"].apply(format_money)
-points["tickets_display"] = points["tickets"].apply(format_int)
 
-st.markdown("## 🌍🎤 Tour Map")
+# Poll while the worker has places in hand; a full rerun once it is done
+# turns the timer off again
+polling = geocoder.pending > 0
+
+
+# Keyed on how many points are placed: a rerun redraws the map only when
+# the worker has placed more of them
+@st.cache_data(max_entries=4, show_spinner=False)
+def map_figure(version: Optional[str], today_iso: str, placed: int, _shown: pd.DataFrame):
+    fig_map = px.scatter_mapbox(
+        _shown,
+        lat="lat",
+        lon="lon",
+        color="status",
+        hover_name="city",
+        hover_data={
+            "country": True,
+            "venue": True,
+            "date_range": True,
+            "shows": True,
+            "gross_display": True,
+            "tickets_display": True,
+            "lat": False,
+            "lon": False,
+            "status": False,
+        },
+        zoom=2,
+        height=520,
+    )
 
-fig_map = px.scatter_mapbox(
-    points,
-    lat="lat",
-    lon="lon",
-    color="status",
-    hover_name="city",
-    hover_data={
-        "country": True,
-        "venue": True,
-        "date_range": True,
-        "shows": True,
-        "gross_display": True,
-        "tickets_display": True,
-        "lat": False,
-        "lon": False,
-        "status": False,
-    },
-    zoom=2,
-    height=520,
-)
+    # OpenStreetMap tiles (no token needed)
+    fig_map.update_layout(
+        mapbox_style="open-street-map",
+        margin={"r": 0, "t": 0, "l": 0, "b": 0},
+        legend_title_text="Tour Status",
+    )
 
-# OpenStreetMap tiles (no token needed)
-fig_map.update_layout(
-    mapbox_style="open-street-map",
-    margin={"r": 0, "t": 0, "l": 0, "b": 0},
-    legend_title_text="Tour Status",
-)
+    # Bigger dots + force colors
+    fig_map.for_each_trace(
+        lambda t: t.update(marker=dict(
+            size=15,
+            opacity=0.85,
+            color=(
+                "gold" if "Current stop" in t.name
+                else "green" if "Happened" in t.name
+                else "red"
+            ),
+        ))
+    )
 
-# Bigger dots + force colors
-fig_map.for_each_trace(
-    lambda t: t.update(marker=dict(
-        size=15,
-        opacity=0.85,
-        color=(
-            "gold" if "Current stop" in t.name
-            else "green" if "Happened" in t.name
-            else "red"
-        ),
-    ))
-)
+    # Auto-center/zoom to your points (removes Antarctica problem entirely)
+    fig_map.update_layout(
+        mapbox_bounds={
+            "west": float(_shown["lon"].min()) - 5,
+            "east": float(_shown["lon"].max()) + 5,
+            "south": float(_shown["lat"].min()) - 5,
+            "north": float(_shown["lat"].max()) + 5,
+        }
+    )
+    return fig_map
 
 
+@st.fragment(run_every=2 if polling else None)
+def tour_map():
+    if points["lat"].isna().any():
+        shown = fill_coordinates(points, coordinates_frame(geocoder.known()))
+    else:
+        shown = points
+    # Keep only rows with coordinates
+    shown = shown.dropna(subset=["lat", "lon"])
 
-# Auto-center/zoom to your points (removes Antarctica problem entirely)
-fig_map.update_layout(
-    mapbox_bounds={
-        "west": float(points["lon"].min()) - 5,
-        "east": float(points["lon"].max()) + 5,
-        "south": float(points["lat"].min()) - 5,
-        "north": float(points["lat"].max()) + 5,
-    }
-)
+    fig_map = map_figure(data_ver, today_iso, len(shown), shown)
+    st.plotly_chart(fig_map, use_container_width=True,config={"responsive": True})
+    if polling and not geocoder.pending:
+        st.rerun()
 
 
+tour_map()
 
-st.plotly_chart(fig_map, use_container_width=True,config={"responsive": True})
 
                   
            
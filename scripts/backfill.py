@@ -0,0 +1,98 @@
+"""
+Rebuild snapshot / event history from the raw page archive (data/raw).
+
+Every archived page is re-parsed with the current parser, so parser fixes
+apply to the whole history. Identical pages are parsed once; distinct pages
+are parsed in parallel across processes.
+
+    python scripts/backfill.py                      # -> data/backfill/
+    python scripts/backfill.py --workers 8 --engine lxml --out /tmp/history
+    python scripts/backfill.py --db data/tourboard.sqlite   # also load SQLite
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict
+from pathlib import Path
+
+import pandas as pd
+
+from tourboard.db import clear_snapshots, get_conn, init_db, insert_snapshots, upsert_events
+from tourboard.fetch import CACHE_DIR, PageCache
+from tourboard.history import clear_history, record_scrape
+from tourboard.scraping import extract_lines, parse_events, parse_snapshot
+
+OUT_DIR = Path("data") / "backfill"
+
+
+def parse_archived(job):
+    """Worker: parse one stored page. Returns (digest, snapshot dict, events)."""
+    root, digest, engine = job
+    html = PageCache(Path(root)).read_blob(digest)
+    lines = extract_lines(html, engine)
+    snap = asdict(parse_snapshot(lines, source_url="", scraped_at=""))
+    events = parse_events(lines, scraped_at="", source_url="")
+    return digest, snap, events
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--cache", type=Path, default=CACHE_DIR)
+    ap.add_argument("--out", type=Path, default=OUT_DIR)
+    ap.add_argument("--workers", type=int, default=os.cpu_count())
+    ap.add_argument("--engine", default=None, help="text extraction engine (bs4 / lxml)")
+    ap.add_argument("--db", type=Path, default=None, help="also load the rebuilt history into this SQLite file")
+    args = ap.parse_args()
+
+    t0 = time.perf_counter()
+    cache = PageCache(args.cache)
+    archive = cache.archived()
+    if not archive:
+        raise SystemExit(f"No archived pages in {cache.archive_path}")
+
+    digests = sorted({row["content_hash"] for row in archive})
+    jobs = [(str(cache.root), d, args.engine) for d in digests]
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        parsed = {d: (snap, events) for d, snap, events in pool.map(parse_archived, jobs, chunksize=4)}
+
+    snaps, events = [], []
+    for row in sorted(archive, key=lambda r: r["scraped_at"]):
+        snap, evs = parsed[row["content_hash"]]
+        stamp = {"scraped_at": row["scraped_at"], "source_url": row["source_url"]}
+        snaps.append({**snap, **stamp})
+        events.extend({**ev, **stamp} for ev in evs)
+
+    args.out.mkdir(parents=True, exist_ok=True)
+    snaps_df = pd.DataFrame(snaps)
+    events_df = pd.DataFrame(events)
+    snaps_df.to_csv(args.out / "snapshots.csv", index=False)
+    events_df.to_csv(args.out / "events_history.csv", index=False)
+
+    if args.db:
+        conn = get_conn(args.db, profile="ingest")
+        try:
+            init_db(conn)
+            # the archive is the whole record for these pages: replace, don't append
+            for url in {row["source_url"] for row in archive}:
+                clear_snapshots(conn, url)
+            insert_snapshots(conn, snaps)
+            upsert_events(conn, events_df)
+            # event versions + rollups, replayed oldest first
+            for url in {row["source_url"] for row in archive}:
+                clear_history(conn, url)
+            for row in sorted(archive, key=lambda r: r["scraped_at"]):
+                _, evs = parsed[row["content_hash"]]
+                record_scrape(conn, row["source_url"], row["scraped_at"], evs)
+        finally:
+            conn.close()
+
+    print(
+        f"Re-parsed {len(digests)} distinct pages for {len(archive)} scrapes "
+        f"({len(events_df)} event rows) in {time.perf_counter() - t0:.2f}s -> {args.out}"
+        + (f", {args.db}" if args.db else "")
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Offline parser benchmarks.
+
+Runs the Touring Data parser (both text engines) and the setlist.fm songs
+table parser over the pages in bench/corpus, plus synthetic versions of each
+page with every table row repeated N times. Reports wall time per stage,
+throughput and peak traced memory. No network access.
+
+    python scripts/bench_parsers.py                  # scales 1 10 100
+    python scripts/bench_parsers.py --scales 1000 --repeat 1 --json out.json
+"""
+import argparse
+import json
+import re
+import statistics
+import time
+import tracemalloc
+from pathlib import Path
+
+from bs4 import BeautifulSoup
+
+from tourboard.scraping import PARSER_ENGINES, extract_lines, parse_events, parse_snapshot
+from tourboard.setlist import find_songs_table, parse_songs_table, songs_frame
+
+CORPUS_DIR = Path("bench") / "corpus"
+
+_ROW_RE = re.compile(r"<tr\b.*?</tr>\n?", re.DOTALL | re.IGNORECASE)
+
+
+def scale_page(html: str, factor: int) -> str:
+    """Repeat every data row (<tr> with <td> cells) `factor` times in place."""
+    if factor == 1:
+        return html
+
+    def rep(m):
+        row = m.group(0)
+        return row * factor if "<td" in row.lower() else row
+
+    return _ROW_RE.sub(rep, html)
+
+
+def touringdata_stages(html: str, engine: str):
+    lines = yield "lines", lambda: extract_lines(html, engine)
+    yield "snapshot", lambda: parse_snapshot(lines)
+    events = yield "events", lambda: parse_events(lines, scraped_at="bench", source_url="bench")
+    return len(events)
+
+
+def setlist_stages(html: str, engine: str = "bs4"):
+    soup = yield "soup", lambda: BeautifulSoup(html, "lxml")
+    table = yield "table", lambda: find_songs_table(soup)
+    rows = yield "rows", lambda: parse_songs_table(table)
+    yield "frame", lambda: songs_frame(rows)
+    return len(rows)
+
+
+def run_stages(gen_fn, html, engine):
+    """Drive a stage generator once; returns ({stage: seconds}, items)."""
+    gen = gen_fn(html, engine)
+    times = {}
+    value = None
+    try:
+        name, fn = gen.send(None)
+        while True:
+            t0 = time.perf_counter()
+            value = fn()
+            times[name] = time.perf_counter() - t0
+            name, fn = gen.send(value)
+    except StopIteration as stop:
+        return times, stop.value
+
+
+def peak_memory(gen_fn, html, engine) -> int:
+    tracemalloc.start()
+    try:
+        run_stages(gen_fn, html, engine)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def bench(name, gen_fn, html, engine, repeat):
+    runs = [run_stages(gen_fn, html, engine) for _ in range(repeat)]
+    items = runs[0][1]
+    stages = {k: statistics.median(r[0][k] for r in runs) for k in runs[0][0]}
+    total = sum(stages.values())
+    return {
+        "parser": name,
+        "engine": engine,
+        "bytes": len(html.encode("utf-8")),
+        "items": items,
+        "total_s": total,
+        "items_per_s": items / total if total else None,
+        "mb_per_s": len(html.encode("utf-8")) / 1e6 / total if total else None,
+        "stages_s": stages,
+        "peak_mem_bytes": peak_memory(gen_fn, html, engine),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--scales", type=int, nargs="+", default=[1, 10, 100])
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--corpus", type=Path, default=CORPUS_DIR)
+    ap.add_argument("--json", type=Path, help="also write the results here")
+    args = ap.parse_args()
+
+    jobs = []
+    for path in sorted(args.corpus.glob("touringdata_*.html")):
+        for engine in PARSER_ENGINES:
+            jobs.append((path, "touringdata", touringdata_stages, engine))
+    for path in sorted(args.corpus.glob("setlistfm_*.html")):
+        jobs.append((path, "setlistfm", setlist_stages, "bs4"))
+    if not jobs:
+        raise SystemExit(f"No corpus pages found in {args.corpus}")
+
+    results = []
+    print(f"{'page':<36} {'engine':<6} {'x':>5} {'items':>8} {'total ms':>10} {'items/s':>10} {'MB/s':>7} {'peak MiB':>9}  stages ms")
+    for path, name, gen_fn, engine in jobs:
+        base = path.read_text(encoding="utf-8")
+        for factor in args.scales:
+            r = bench(name, gen_fn, scale_page(base, factor), engine, args.repeat)
+            r.update(page=path.name, scale=factor)
+            results.append(r)
+            stages = " ".join(f"{k}={v * 1000:.1f}" for k, v in r["stages_s"].items())
+            print(
+                f"{path.name:<36} {engine:<6} {factor:>5} {r['items']:>8} {r['total_s'] * 1000:>10.1f} "
+                f"{r['items_per_s'] or 0:>10.0f} {r['mb_per_s'] or 0:>7.2f} {r['peak_mem_bytes'] / 2**20:>9.1f}  {stages}"
+            )
+
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2), encoding="utf-8")
+        print("Wrote", args.json)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Build the offline gazetteer bundled at tourboard/data/gazetteer.csv.gz.
+
+Source: GeoNames cities with population >= 15000 (CC BY 4.0,
+https://www.geonames.org), via the geonamescache package (in requirements.txt):
+
+    python scripts/build_gazetteer.py
+
+One row per (normalised name, country): the city's own name, plus the
+Latin-script alternate names of larger cities (exonyms like "Lisboa" /
+"Lisbon" or "Ciudad de Mexico" / "Mexico City"; for small towns these are
+mostly transliterations nobody types). Accents never matter, so
+"Dusseldorf" matches "Düsseldorf" either way.
+"""
+import argparse
+import csv
+import gzip
+import io
+import re
+from pathlib import Path
+
+import geonamescache
+
+from tourboard.gazetteer import GAZETTEER_PATH, normalise
+
+_LATIN_KEY_RE = re.compile(r"^[a-z0-9' .-]{2,40}$")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--out", type=Path, default=GAZETTEER_PATH)
+    ap.add_argument("--min-population", type=int, default=15000)
+    ap.add_argument("--alt-names-population", type=int, default=100000,
+                    help="include alternate names only for cities at least this big")
+    args = ap.parse_args()
+
+    cities = geonamescache.GeonamesCache(min_city_population=args.min_population).get_cities()
+    best = {}
+    for c in cities.values():
+        names = {c["name"]}
+        if c["population"] >= args.alt_names_population:
+            names.update(c.get("alternatenames", []))
+        for name in names:
+            key = normalise(name)
+            if not _LATIN_KEY_RE.match(key):
+                continue
+            k = (key, c["countrycode"])
+            # same name twice in one country: keep the bigger city
+            if k not in best or c["population"] > best[k]["population"]:
+                best[k] = c
+
+    args.out.parent.mkdir(parents=True, exist_ok=True)
+    # mtime=0 so rebuilding from the same data gives the same bytes
+    with io.TextIOWrapper(gzip.GzipFile(args.out, "wb", mtime=0), encoding="utf-8", newline="") as f:
+        w = csv.writer(f)
+        w.writerow(["key", "country_code", "lat", "lon", "population", "name"])
+        for (key, cc), c in sorted(best.items()):
+            w.writerow([key, cc, round(c["latitude"], 4), round(c["longitude"], 4), c["population"], c["name"]])
+    print(f"Wrote {len(best)} names for {len(cities)} cities -> {args.out}")
+
+
+if __name__ == "__main__":
+    main()
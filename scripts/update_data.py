@@ -1,32 +1,154 @@
+import argparse
 from pathlib import Path
 import pandas as pd
 
-from tourboard.scraping import scrape_all
+from tourboard.batch import scrape_many
+from tourboard.changes import diff_events
+from tourboard.db import get_conn, init_db, insert_snapshots, upsert_events
+from tourboard.fetch import PageCache
+from tourboard.geocode import attach_coordinates
+from tourboard.geoworker import GeocodeWorker
+from tourboard.history import record_scrape
+from tourboard.scraping import SOURCE_URL
+from tourboard.storage import HOT_EVENTS, ParquetStore, hot_schema, publish_events, read_hot
 
 DATA_DIR = Path("data")
 DATA_DIR.mkdir(exist_ok=True)
 
 EVENTS_CSV = DATA_DIR / "events_latest.csv"
-SNAPS_CSV = DATA_DIR / "snapshots.csv"
+SNAPS_CSV = DATA_DIR / "snapshots.csv"  # legacy; moved into the store on first run
+CHANGES_CSV = DATA_DIR / "event_changes.csv"
+
+
+def seed_store(store: ParquetStore) -> None:
+    """One-time move of the old CSV outputs into the Parquet store."""
+    if not store.has_events() and EVENTS_CSV.exists():
+        old = pd.read_csv(EVENTS_CSV)
+        for url, rows in old.groupby("source_url"):
+            store.write_events(url, rows["scraped_at"].max(), rows.to_dict("records"))
+    if not store.has_snapshots() and SNAPS_CSV.exists():
+        store.append_snapshots(pd.read_csv(SNAPS_CSV).to_dict("records"))
+        SNAPS_CSV.unlink()
+
+def publish_latest(store: ParquetStore) -> None:
+    """
+    Geocode the current stops of every tour and publish them. Places already
+    placed in the previous hot file reuse its coordinates; new ones go
+    through the geocode worker (geocache in data/tourboard.sqlite, the
+    gazetteer, then Nominatim at its rate limit). The app only reads the
+    result.
+    """
+    previous = read_hot() if HOT_EVENTS.exists() else None
+    worker = GeocodeWorker()
+    try:
+        latest = attach_coordinates(store.read_latest_events(), worker, previous=previous)
+    finally:
+        worker.close()
+    publish_events(latest)
+
+def needs_coordinates() -> bool:
+    """Hot file missing, or published before coordinates were attached."""
+    return not HOT_EVENTS.exists() or "lat" not in hot_schema().names
+
+def save_cache(cache: PageCache, results, before: dict, fresh=()) -> None:
+    """
+    Persist what this run learned about the pages: archive the fresh ones,
+    keep the new validators of unchanged ones (a rotated ETag /
+    Last-Modified with the same body), and roll failed ones back.
+    """
+    for r in fresh:
+        cache.archive(r.url, r.content_hash, r.snapshot.scraped_at)
+    for r in results.values():
+        if not r.ok:
+            cache.forget(r.url)
+            if r.url in before:
+                cache.index[r.url] = before[r.url]
+    cache.save()
 
 def main():
-    snap, events = scrape_all()
-    if len(events) == 0:
-        raise RuntimeError("Scrape returned 0 events. Aborting update.")
-
-    df_events = pd.DataFrame(events)
-    df_events.to_csv(EVENTS_CSV, index=False)
-
-    # append snapshot
-    snap_row = pd.DataFrame([snap.__dict__])
-    if SNAPS_CSV.exists():
-        old = pd.read_csv(SNAPS_CSV)
-        out = pd.concat([old, snap_row], ignore_index=True)
-    else:
-        out = snap_row
-
-    out.to_csv(SNAPS_CSV, index=False)
-    print("Updated:", EVENTS_CSV, SNAPS_CSV)
+    ap = argparse.ArgumentParser()
+    ap.add_argument("urls", nargs="*", default=[SOURCE_URL], help="tour pages to scrape (default: the DTMF tour)")
+    ap.add_argument("--force", action="store_true", help="re-parse and rewrite even if the pages are unchanged")
+    ap.add_argument("--workers", type=int, default=8)
+    ap.add_argument("--per-host", type=int, default=2, help="max concurrent requests per host")
+    ap.add_argument("--db", type=Path, default=None, help="also record the scrape (events, history, rollups) in this SQLite file")
+    args = ap.parse_args()
+
+    # Conditional fetches; raw pages are kept in data/raw keyed by content hash
+    cache = PageCache()
+    if args.force:
+        for url in args.urls:
+            cache.forget(url)
+    before = dict(cache.index)
+    results = scrape_many(args.urls, max_workers=args.workers, per_host=args.per_host, cache=cache)
+
+    for r in results.values():
+        if not r.ok:
+            print(f"FAILED {r.url}: {r.error}")
+        elif not r.changed:
+            print(f"Unchanged {r.url}")
+        elif len(r.events) == 0:
+            r.error = "scrape returned 0 events"
+            print(f"FAILED {r.url}: {r.error}")
+
+    fresh = [r for r in results.values() if r.ok and r.changed]
+    if all(not r.ok for r in results.values()):
+        raise RuntimeError("Every scrape failed. Aborting update.")
+
+    store = ParquetStore()
+    seed_store(store)
+    if not fresh:
+        if store.has_events() and needs_coordinates():
+            publish_latest(store)
+            save_cache(cache, results, before)
+            print("Source pages unchanged since last run. Republished with coordinates:", HOT_EVENTS, EVENTS_CSV)
+            return
+        save_cache(cache, results, before)
+        print("Source pages unchanged since last run. Nothing to update.")
+        return
+
+    # Only inserted / changed / removed stops are passed downstream
+    fresh_urls = {r.url for r in fresh}
+    previous = store.read_latest_events(source_urls=fresh_urls).to_dict("records")
+    current = [ev for r in fresh for ev in r.events]
+    changes = diff_events(previous, current)
+    print("Event changes:", changes.summary())
+
+    if not changes.empty:
+        # a new events file only for tours whose stops changed; the others
+        # (and unchanged / failed pages) keep their latest file
+        changed_urls = {row["source_url"] for row in changes.records()}
+        for r in fresh:
+            if r.url in changed_urls:
+                store.write_events(r.url, r.snapshot.scraped_at, r.events)
+        publish_latest(store)
+
+        change_rows = pd.DataFrame(changes.records())
+        # each tour's own scrape time: the pages are fetched concurrently
+        scraped_at = {r.url: r.snapshot.scraped_at for r in fresh}
+        change_rows["detected_at"] = change_rows["source_url"].map(scraped_at)
+        change_rows = change_rows.reindex(columns=["detected_at", "change", *pd.DataFrame(current).columns])
+        change_rows.to_csv(CHANGES_CSV, mode="a", header=not CHANGES_CSV.exists(), index=False)
+    elif needs_coordinates():
+        publish_latest(store)
+
+    # one new file per snapshot, however long the history
+    store.append_snapshots([r.snapshot.__dict__ for r in fresh])
+
+    if args.db:
+        conn = get_conn(args.db)
+        try:
+            init_db(conn)
+            insert_snapshots(conn, [r.snapshot.__dict__ for r in fresh])
+            for r in fresh:
+                upsert_events(conn, pd.DataFrame(r.events))
+                record_scrape(conn, r.url, r.snapshot.scraped_at, r.events)
+        finally:
+            conn.close()
+
+    # only remember the pages once everything derived from them is written
+    save_cache(cache, results, before, fresh)
+    print("Updated:", store.root, *([HOT_EVENTS, EVENTS_CSV, CHANGES_CSV] if not changes.empty else []))
 
 if __name__ == "__main__":
     main()
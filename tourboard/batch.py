@@ -0,0 +1,105 @@
+from __future__ import annotations
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional
+from urllib.parse import urlsplit
+
+import requests
+
+from tourboard.fetch import PageCache, fetch_page
+from tourboard.scraping import Snapshot, fetch_html, scrape_html
+from tourboard.transport import new_session
+
+
+@dataclass
+class ScrapeResult:
+    url: str
+    snapshot: Optional[Snapshot] = None
+    events: List[Dict] = field(default_factory=list)
+    changed: bool = True
+    content_hash: Optional[str] = None
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+class HostLimiter:
+    """
+    Per-host budget: at most `max_concurrent` requests in flight per host,
+    and request starts spaced at least `min_interval` seconds apart.
+    """
+
+    def __init__(self, max_concurrent: int = 2, min_interval: float = 1.0):
+        self.max_concurrent = max_concurrent
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self._sems: Dict[str, threading.Semaphore] = {}
+        self._next_start: Dict[str, float] = {}
+
+    @contextmanager
+    def slot(self, url: str):
+        host = urlsplit(url).netloc.lower()
+        with self._lock:
+            sem = self._sems.setdefault(host, threading.Semaphore(self.max_concurrent))
+        with sem:
+            with self._lock:
+                now = time.monotonic()
+                start = max(now, self._next_start.get(host, now))
+                self._next_start[host] = start + self.min_interval
+            if start > now:
+                time.sleep(start - now)
+            yield
+
+
+def scrape_many(
+    urls: Iterable[str],
+    max_workers: int = 8,
+    per_host: int = 2,
+    min_interval: float = 1.0,
+    cache: Optional[PageCache] = None,
+    session: Optional[requests.Session] = None,
+    timeout: int = 25,
+) -> Dict[str, ScrapeResult]:
+    """
+    Fetch and parse many tour pages concurrently.
+
+    Returns {url: ScrapeResult} in input order. A failing URL gets its error
+    recorded on its result and does not affect the others. With a cache,
+    fetches are conditional and unchanged pages come back with
+    changed=False and no parse (the caller saves the cache).
+    """
+    urls = list(dict.fromkeys(urls))
+    limiter = HostLimiter(per_host, min_interval)
+    own_session = session is None
+    session = session or new_session(pool_size=max_workers)
+
+    def one(url: str) -> ScrapeResult:
+        try:
+            with limiter.slot(url):
+                digest = None
+                if cache is not None:
+                    page = fetch_page(url, cache, timeout=timeout, session=session)
+                    if not page.changed:
+                        return ScrapeResult(url, changed=False, content_hash=page.content_hash)
+                    html, digest = page.html, page.content_hash
+                else:
+                    html = fetch_html(url, timeout=timeout, session=session)
+            snap, events = scrape_html(html, url)
+            return ScrapeResult(url, snap, events, content_hash=digest)
+        except Exception as e:
+            return ScrapeResult(url, error=f"{type(e).__name__}: {e}")
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(urls)))) as pool:
+            results = list(pool.map(one, urls))
+    finally:
+        if own_session:
+            session.close()
+
+    return {r.url: r for r in results}
@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import math
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Tuple
+
+# Natural key of a tour stop: one run at one venue on one date range.
+KEY_FIELDS = ("date_range", "venue", "city")
+
+# Everything else a scrape can change about a stop. scraped_at / source_url
+# are deliberately left out so re-scraping identical data hashes the same.
+CONTENT_FIELDS = (
+    "region",
+    "start_date",
+    "end_date",
+    "artist",
+    "country",
+    "gross_usd",
+    "tickets",
+    "capacity_pct",
+    "shows",
+)
+
+
+def _canon(v):
+    """Same value whether it came from the parser or back from a CSV / SQLite."""
+    if hasattr(v, "item") and not isinstance(v, str):  # numpy scalars
+        v = v.item()
+    if v is None or isinstance(v, str):
+        return v
+    if isinstance(v, float):
+        if math.isnan(v):
+            return None
+        return int(v) if v.is_integer() else v
+    try:
+        if v != v:  # NaT
+            return None
+    except TypeError:  # pd.NA
+        return None
+    return v
+
+
+def _stored(ev: Dict, name: str):
+    return _canon(ev.get(name)) or None
+
+
+def event_key(ev: Dict) -> str:
+    """Natural key "date_range|venue|city"; missing parts are empty strings."""
+    parts = []
+    for k in KEY_FIELDS:
+        v = _canon(ev.get(k))
+        parts.append("" if v is None else str(v))
+    return "|".join(parts)
+
+
+def content_hash(ev: Dict) -> str:
+    payload = json.dumps([_canon(ev.get(k)) for k in CONTENT_FIELDS], ensure_ascii=False, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def annotate(ev: Dict) -> Dict:
+    ev["event_key"] = event_key(ev)
+    ev["content_hash"] = content_hash(ev)
+    return ev
+
+
+@dataclass
+class EventChanges:
+    inserted: List[Dict] = field(default_factory=list)
+    changed: List[Dict] = field(default_factory=list)
+    removed: List[Dict] = field(default_factory=list)
+    unchanged: int = 0
+
+    @property
+    def empty(self) -> bool:
+        return not (self.inserted or self.changed or self.removed)
+
+    def summary(self) -> str:
+        return (
+            f"{len(self.inserted)} inserted, {len(self.changed)} changed, "
+            f"{len(self.removed)} removed, {self.unchanged} unchanged"
+        )
+
+    def records(self) -> List[Dict]:
+        """All changes as flat rows with a "change" column."""
+        out = []
+        for kind, rows in (("inserted", self.inserted), ("changed", self.changed), ("removed", self.removed)):
+            out.extend(dict(r, change=kind) for r in rows)
+        return out
+
+
+def _indexed(events: Iterable[Dict]) -> Dict[Tuple[str, str], Dict]:
+    # keyed per tour page so two tours can never cancel each other out
+    out = {}
+    for ev in events:
+        key = _stored(ev, "event_key") or event_key(ev)
+        out[(_stored(ev, "source_url") or "", key)] = ev
+    return out
+
+
+def diff_events(previous: Iterable[Dict], current: Iterable[Dict]) -> EventChanges:
+    """
+    Compare two scrapes by natural key and content hash.
+
+    `changed` holds the new version of each changed stop, `removed` the old
+    version of stops that disappeared. Rows without a stored hash (e.g. an
+    older CSV) are hashed on the fly.
+    """
+    prev = _indexed(previous)
+    cur = _indexed(current)
+    changes = EventChanges()
+    for k, ev in cur.items():
+        old = prev.get(k)
+        if old is None:
+            changes.inserted.append(ev)
+        elif (_stored(old, "content_hash") or content_hash(old)) != (_stored(ev, "content_hash") or content_hash(ev)):
+            changes.changed.append(ev)
+        else:
+            changes.unchanged += 1
+    changes.removed = [ev for k, ev in prev.items() if k not in cur]
+    return changes
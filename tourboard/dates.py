@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+import re
+from datetime import date, datetime
+from functools import lru_cache
+from typing import Optional, Tuple
+
+import pandas as pd
+
+# "February 28-Mar. 1, 2026"
+_CROSS_MONTH_RE = re.compile(r"^([A-Za-z]{3,}\.?)\s+(\d{1,2})-([A-Za-z]{3,}\.?)\s+(\d{1,2}),\s*(\d{4})$")
+# "November 21-22, 2025" / "July 1, 2026"
+_SAME_MONTH_RE = re.compile(r"^([A-Za-z]{3,}\.?)\s+(\d{1,2})(?:-(\d{1,2}))?,\s*(\d{4})$")
+
+
+def _month_to_num(m: str) -> int:
+    m = m.strip().replace(".", "")
+    return datetime.strptime(m[:3], "%b").month
+
+
+@lru_cache(maxsize=4096)
+def _parse(s: str) -> Tuple[Optional[date], Optional[date]]:
+    try:
+        m = _CROSS_MONTH_RE.match(s)
+        if m:
+            m1, d1, m2, d2, y = m.groups()
+            y = int(y)
+            start = date(y, _month_to_num(m1), int(d1))
+            end = date(y, _month_to_num(m2), int(d2))
+            if end < start:
+                # "December 30-Jan. 2, 2026": the year belongs to the end date
+                start = start.replace(year=y - 1)
+            return (start, end)
+
+        m = _SAME_MONTH_RE.match(s)
+        if m:
+            mon, d1, d2, y = m.groups()
+            y = int(y)
+            start = date(y, _month_to_num(mon), int(d1))
+            end = date(y, _month_to_num(mon), int(d2)) if d2 else start
+            return (start, end)
+    except ValueError:  # unknown month name / impossible day
+        pass
+    return (None, None)
+
+
+def parse_date_range(date_range) -> Tuple[Optional[date], Optional[date]]:
+    """
+    Returns (start_date, end_date) as datetime.date, (None, None) if unparseable.
+    Handles:
+      - "November 21-22, 2025"
+      - "December 10-21, 2025"
+      - "February 28-Mar. 1, 2026"
+      - "July 1, 2026"
+    Results are memoised per string.
+    """
+    if not isinstance(date_range, str) or not date_range.strip():
+        return (None, None)
+    return _parse(date_range.strip())
+
+
+def iso_date_range(date_range) -> Tuple[Optional[str], Optional[str]]:
+    start, end = parse_date_range(date_range)
+    return (
+        start.isoformat() if start else None,
+        end.isoformat() if end else None,
+    )
+
+
+def add_run_dates(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Adds datetime64 start_dt / end_dt columns from the stored start_date /
+    end_date. Rows scraped before those were filled in fall back to parsing
+    date_range, once per distinct string.
+    """
+    out = df.copy()
+    for src, dst, pos in (("start_date", "start_dt", 0), ("end_date", "end_dt", 1)):
+        stored = out[src] if src in out.columns else pd.Series(None, index=out.index, dtype="object")
+        col = pd.to_datetime(stored, errors="coerce")
+        missing = col.isna() & out["date_range"].notna()
+        if missing.any():
+            parsed = {s: parse_date_range(s)[pos] for s in out.loc[missing, "date_range"].unique()}
+            col = col.where(~missing, pd.to_datetime(out.loc[missing, "date_range"].map(parsed), errors="coerce"))
+        out[dst] = col
+    return out
@@ -2,108 +2,158 @@ from __future__ import annotations
 
 import sqlite3
 from pathlib import Path
-from typing import Optional
+from typing import Dict, Iterable, List, Optional, Tuple
 import pandas as pd
 
-DB_PATH = Path("data") / "tourboard.sqlite"
+from tourboard.changes import KEY_FIELDS
+from tourboard.migrations import migrate
+from tourboard.schema import apply_event_schema
 
+DB_PATH = Path("data") / "tourboard.sqlite"
 
-def get_conn(db_path: Optional[Path] = None) -> sqlite3.Connection:
+# Per-connection tuning. "ingest" is for backfills / batch loads: a lost
+# write can be redone from the page archive, so it skips fsyncs and keeps a
+# big page cache. "serve" is for the app: durable WAL commits, and reads go
+# through mmap instead of read() copies.
+PRAGMA_PROFILES: Dict[str, Dict[str, object]] = {
+    "ingest": {
+        "synchronous": "OFF",
+        "cache_size": -262144,  # KiB, i.e. 256 MiB
+        "temp_store": "MEMORY",
+        "mmap_size": 0,
+    },
+    "serve": {
+        "synchronous": "NORMAL",
+        "cache_size": -32768,  # 32 MiB
+        "temp_store": "MEMORY",
+        "mmap_size": 268435456,  # 256 MiB
+    },
+}
+
+
+def apply_pragmas(conn: sqlite3.Connection, profile: str) -> None:
+    if profile not in PRAGMA_PROFILES:
+        raise ValueError(f"Unknown PRAGMA profile {profile!r} (expected one of {list(PRAGMA_PROFILES)})")
+    for name, value in PRAGMA_PROFILES[profile].items():
+        conn.execute(f"PRAGMA {name}={value};")
+
+
+def get_conn(db_path: Optional[Path] = None, profile: Optional[str] = None, **connect_kwargs) -> sqlite3.Connection:
     path = db_path or DB_PATH
     path.parent.mkdir(parents=True, exist_ok=True)
-    conn = sqlite3.connect(path)
+    conn = sqlite3.connect(path, **connect_kwargs)
     conn.execute("PRAGMA journal_mode=WAL;")
     conn.execute("PRAGMA foreign_keys=ON;")
+    if profile:
+        apply_pragmas(conn, profile)
     return conn
 
 
-def init_db(conn):
-    conn.executescript(
-        """
-        CREATE TABLE IF NOT EXISTS snapshots (
-            scraped_at TEXT,
-            source_url TEXT,
-            reported_revenue_usd REAL,
-            reported_tickets INTEGER,
-            avg_price_usd REAL,
-            total_reports_text TEXT
-        );
-
-        CREATE TABLE IF NOT EXISTS events (
-            region TEXT,
-            date_range TEXT,
-            start_date TEXT,
-            end_date TEXT,
-            artist TEXT,
-            venue TEXT,
-            city TEXT,
-            country TEXT,
-            gross_usd REAL,
-            tickets INTEGER,
-            capacity_pct REAL,
-            shows INTEGER,
-            source_url TEXT,
-            scraped_at TEXT
-        );
-
-        CREATE TABLE IF NOT EXISTS geocache (
-            key TEXT PRIMARY KEY,
-            city TEXT,
-            country TEXT,
-            lat REAL,
-            lon REAL,
-            provider TEXT,
-            updated_at TEXT
-        );
-        """
-
-    )
-
-    conn.commit()
-
-
-def ensure_snapshots_schema(conn: sqlite3.Connection) -> None:
-    """
-    Add missing columns to snapshots table to handle schema changes over time.
-    Safe to run on every startup.
-    """
-    cur = conn.execute("PRAGMA table_info(snapshots)")
-    existing = {row[1] for row in cur.fetchall()}  # row[1] = column name
+def init_db(conn: sqlite3.Connection) -> None:
+    """Create / upgrade the schema (see tourboard.migrations)."""
+    migrate(conn)
+
+
+# Kept for older callers; covered by the migrations now.
+ensure_snapshots_schema = init_db
 
-    desired = {
-        "scraped_at": "TEXT",
-        "reported_revenue_usd": "REAL",
-        "reported_tickets": "INTEGER",
-        "avg_revenue_usd": "REAL",
-        "avg_tickets": "INTEGER",
-        "avg_price_usd": "REAL",
-        "total_reports_text": "TEXT",
-        "source_url": "TEXT",
-    }
 
-    for col, col_type in desired.items():
-        if col not in existing:
-            conn.execute(f"ALTER TABLE snapshots ADD COLUMN {col} {col_type};")
+EVENT_COLUMNS = [
+    "region", "date_range", "start_date", "end_date", "artist", "venue", "city", "country",
+    "gross_usd", "tickets", "capacity_pct", "shows", "source_url", "scraped_at",
+    "event_key", "content_hash",
+]
 
-    conn.commit()
 
+def _event_keys(df: pd.DataFrame) -> pd.Series:
+    """Vectorised tourboard.changes.event_key for string key columns."""
+    parts = [
+        df[k].astype(object).where(df[k].notna(), "").astype(str) if k in df.columns else pd.Series("", index=df.index)
+        for k in KEY_FIELDS
+    ]
+    out = parts[0]
+    for p in parts[1:]:
+        out = out + "|" + p
+    return out
 
 
+def _param_rows(df: pd.DataFrame, columns: List[str]) -> List[tuple]:
+    """DataFrame -> plain Python tuples sqlite3 can bind (NaN/NA -> NULL)."""
+    arr = df.reindex(columns=columns).to_numpy(dtype=object)
+    arr[pd.isna(arr)] = None
+    return list(map(tuple, arr))
+
+
+_EVENT_UPSERT_SQL = """
+INSERT INTO events ({cols}) VALUES ({marks})
+ON CONFLICT(source_url, event_key) DO UPDATE SET {updates}
+WHERE excluded.scraped_at >= events.scraped_at
+""".format(
+    cols=", ".join(EVENT_COLUMNS),
+    marks=", ".join("?" for _ in EVENT_COLUMNS),
+    updates=", ".join(f"{c} = excluded.{c}" for c in EVENT_COLUMNS if c not in ("source_url", "event_key")),
+)
+
+_LATEST_SCRAPE_SQL = """
+INSERT INTO latest_scrape (source_url, scraped_at) VALUES (?, ?)
+ON CONFLICT(source_url) DO UPDATE SET scraped_at = excluded.scraped_at
+WHERE excluded.scraped_at > latest_scrape.scraped_at
+"""
+
 
 def upsert_events(conn: sqlite3.Connection, df: pd.DataFrame) -> None:
-    df.to_sql("events", conn, if_exists="append", index=False)
+    """
+    Insert or update one row per (source_url, event_key). A row only
+    replaces the stored one if it is from the same or a later scrape, so
+    loading old scrapes after new ones cannot roll data back. Moves the
+    latest_scrape pointer forward for each source_url.
+
+    One prepared statement, executemany, one transaction.
+    """
+    if df.empty:
+        return
+    keys = df["event_key"] if "event_key" in df.columns else pd.Series(None, index=df.index, dtype=object)
+    if keys.isna().any():
+        df = df.assign(event_key=keys.fillna(_event_keys(df)))
+    rows = _param_rows(df, EVENT_COLUMNS)
+    latest = df.groupby("source_url", dropna=False)["scraped_at"].max()
+    with conn:
+        conn.executemany(_EVENT_UPSERT_SQL, rows)
+        conn.executemany(_LATEST_SCRAPE_SQL, list(latest.items()))
+
+
+def insert_snapshots(conn: sqlite3.Connection, snaps: Iterable[Dict]) -> None:
+    """Append snapshot dicts in one transaction, one statement per column set."""
+    by_cols: Dict[tuple, List[tuple]] = {}
+    for snap in snaps:
+        by_cols.setdefault(tuple(snap), []).append(tuple(snap.values()))
+    with conn:
+        for cols, rows in by_cols.items():
+            sql = f"INSERT INTO snapshots ({', '.join(cols)}) VALUES ({', '.join('?' for _ in cols)})"
+            conn.executemany(sql, rows)
+
+
+def clear_snapshots(conn: sqlite3.Connection, source_url: Optional[str] = None) -> None:
+    """Drop stored snapshots (for one page, or all) before re-inserting them."""
+    where, args = ("WHERE source_url = ?", (source_url,)) if source_url else ("", ())
+    with conn:
+        conn.execute(f"DELETE FROM snapshots {where}", args)
 
 
 def insert_snapshot(conn: sqlite3.Connection, snap: dict) -> None:
-    pd.DataFrame([snap]).to_sql("snapshots", conn, if_exists="append", index=False)
+    insert_snapshots(conn, [snap])
 
 
 def read_latest_events(conn: sqlite3.Connection) -> pd.DataFrame:
+    """
+    Rows seen in the latest scrape of each tour page. CROSS JOIN pins
+    latest_scrape as the outer loop, so this is one index lookup per tour.
+    """
     q = """
-    SELECT * FROM events
-    WHERE scraped_at = (SELECT MAX(scraped_at) FROM events)
+    SELECT e.* FROM latest_scrape p
+    CROSS JOIN events e ON e.source_url = p.source_url AND e.scraped_at = p.scraped_at
     """
-    return pd.read_sql_query(q, conn)
+    return apply_event_schema(pd.read_sql_query(q, conn))
 
 
 def read_snapshots(conn: sqlite3.Connection) -> pd.DataFrame:
@@ -111,20 +161,55 @@ def read_snapshots(conn: sqlite3.Connection) -> pd.DataFrame:
 
 #Para Mapa
 
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
+
+# How long a failed lookup is remembered before it is tried again. A place
+# the provider does not know stays unknown for a while; timeouts and
+# service errors are usually transient.
+MISS_TTL = timedelta(days=30)
+ERROR_TTL = timedelta(hours=6)
+
 
 def _utc_now_iso():
     return datetime.now(timezone.utc).replace(microsecond=0).isoformat()
 
-def geocache_get(conn: sqlite3.Connection, key: str):
-    cur = conn.execute("SELECT lat, lon FROM geocache WHERE key = ?", (key,))
-    row = cur.fetchone()
-    return row if row else None
-
-def geocache_set(conn: sqlite3.Connection, key: str, city: str, country: str, lat: float, lon: float, provider: str = "nominatim"):
-    conn.execute(
-        "INSERT OR REPLACE INTO geocache (key, city, country, lat, lon, provider, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
-        (key, city, country, lat, lon, provider, _utc_now_iso()),
-    )
-    conn.commit()
 
+def geocache_get_many(conn: sqlite3.Connection, keys: Iterable[str], chunk: int = 500) -> Dict[str, Tuple]:
+    """
+    {key: (lat, lon, expires_at)} for every cached, unexpired key in `keys`
+    (lat / lon None for a remembered failure). One query per `chunk` keys,
+    under SQLite's bound-parameter limit.
+    """
+    keys = list(dict.fromkeys(keys))
+    now = _utc_now_iso()
+    out: Dict[str, Tuple] = {}
+    for i in range(0, len(keys), chunk):
+        part = keys[i:i + chunk]
+        marks = ", ".join("?" for _ in part)
+        for key, lat, lon, expires_at in conn.execute(
+            f"SELECT key, lat, lon, expires_at FROM geocache "
+            f"WHERE key IN ({marks}) AND (expires_at IS NULL OR expires_at > ?)",
+            (*part, now),
+        ):
+            out[key] = (lat, lon, expires_at)
+    return out
+
+
+def geocache_set_many(conn: sqlite3.Connection, rows: Iterable[Tuple]):
+    """
+    Write many lookups in one transaction. Each row is (key, city, country,
+    lat, lon, provider, status); "ok" rows are kept for good, "miss" /
+    "error" rows until their TTL runs out.
+    """
+    now = datetime.now(timezone.utc).replace(microsecond=0)
+    params = [
+        (key, city, country, lat, lon, provider, now.isoformat(), status,
+         None if status == "ok" else (now + (MISS_TTL if status == "miss" else ERROR_TTL)).isoformat())
+        for key, city, country, lat, lon, provider, status in rows
+    ]
+    with conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO geocache (key, city, country, lat, lon, provider, updated_at, status, expires_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            params,
+        )
@@ -0,0 +1,165 @@
+from __future__ import annotations
+
+import csv
+import gzip
+import hashlib
+import json
+import os
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from tourboard.transport import default_session
+
+CACHE_DIR = Path("data") / "raw"
+
+USER_AGENT = "DTMF-Tourboard/1.0 (personal project; contact: you@example.com)"
+
+
+@dataclass
+class FetchResult:
+    url: str
+    html: str
+    content_hash: str
+    changed: bool
+    status_code: int
+
+
+def _now_iso() -> str:
+    return datetime.now(timezone.utc).replace(microsecond=0).isoformat()
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class PageCache:
+    """
+    Raw HTML cache on disk.
+
+    Bodies are stored gzip-compressed under blobs/<hash[:2]>/<hash>.html.gz
+    (sha256 of the UTF-8 text), so identical pages are only kept once.
+    index.json keeps, per URL, the ETag / Last-Modified validators and the
+    hash of the last body we saw. archive.csv is the page history: one row
+    (scraped_at, source_url, content_hash) per scrape that got new content,
+    which is what scripts/backfill.py re-parses.
+    """
+
+    ARCHIVE_COLUMNS = ("scraped_at", "source_url", "content_hash")
+
+    def __init__(self, root: Optional[Path] = None):
+        self.root = Path(root or CACHE_DIR)
+        self.index_path = self.root / "index.json"
+        self.archive_path = self.root / "archive.csv"
+        self._index: Optional[Dict[str, dict]] = None
+
+    @property
+    def index(self) -> Dict[str, dict]:
+        if self._index is None:
+            if self.index_path.exists():
+                self._index = json.loads(self.index_path.read_text(encoding="utf-8"))
+            else:
+                self._index = {}
+        return self._index
+
+    def entry(self, url: str) -> Optional[dict]:
+        return self.index.get(url)
+
+    def blob_path(self, digest: str) -> Path:
+        return self.root / "blobs" / digest[:2] / f"{digest}.html.gz"
+
+    def has_blob(self, digest: str) -> bool:
+        return self.blob_path(digest).exists()
+
+    def read_blob(self, digest: str) -> str:
+        return gzip.decompress(self.blob_path(digest).read_bytes()).decode("utf-8")
+
+    def write_blob(self, text: str) -> str:
+        digest = content_hash(text)
+        path = self.blob_path(digest)
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # per-writer temp name: concurrent fetches of identical bodies write the same blob
+            tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+            # mtime=0 keeps the compressed bytes stable for the same body
+            tmp.write_bytes(gzip.compress(text.encode("utf-8"), mtime=0))
+            os.replace(tmp, path)
+        return digest
+
+    def update(self, url: str, digest: str, etag: Optional[str], last_modified: Optional[str]) -> None:
+        prev = self.index.get(url) or {}
+        same = prev.get("content_hash") == digest
+        self.index[url] = {
+            "content_hash": digest,
+            "etag": etag,
+            "last_modified": last_modified,
+            # when the content last changed (not touched by 304s / identical bodies)
+            "changed_at": prev.get("changed_at") if same else _now_iso(),
+        }
+
+    def archive(self, url: str, digest: str, scraped_at: str) -> None:
+        if not self.has_blob(digest):
+            raise FileNotFoundError(f"No stored page for {digest}")
+        self.root.mkdir(parents=True, exist_ok=True)
+        new = not self.archive_path.exists()
+        with self.archive_path.open("a", newline="", encoding="utf-8") as f:
+            w = csv.writer(f)
+            if new:
+                w.writerow(self.ARCHIVE_COLUMNS)
+            w.writerow((scraped_at, url, digest))
+
+    def archived(self) -> List[Dict[str, str]]:
+        if not self.archive_path.exists():
+            return []
+        with self.archive_path.open(newline="", encoding="utf-8") as f:
+            return list(csv.DictReader(f))
+
+    def forget(self, url: str) -> None:
+        self.index.pop(url, None)
+
+    def save(self) -> None:
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp = self.index_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(self.index, indent=2, sort_keys=True), encoding="utf-8")
+        os.replace(tmp, self.index_path)
+
+
+def fetch_page(url: str, cache: PageCache, timeout: int = 25, session=None) -> FetchResult:
+    """
+    Conditional GET against the cache.
+
+    Sends If-None-Match / If-Modified-Since when we hold a body for the URL.
+    A 304 (or a 200 whose body hashes to what we already have) comes back
+    with changed=False. The cache index is only updated in memory; call
+    cache.save() once the caller has finished with the result.
+    """
+    headers = {"User-Agent": USER_AGENT}
+    prev = cache.entry(url)
+    if prev and cache.has_blob(prev["content_hash"]):
+        if prev.get("etag"):
+            headers["If-None-Match"] = prev["etag"]
+        if prev.get("last_modified"):
+            headers["If-Modified-Since"] = prev["last_modified"]
+    else:
+        prev = None
+
+    r = (session or default_session()).get(url, headers=headers, timeout=timeout)
+
+    if r.status_code == 304 and prev:
+        cache.update(
+            url,
+            prev["content_hash"],
+            r.headers.get("ETag") or prev.get("etag"),
+            r.headers.get("Last-Modified") or prev.get("last_modified"),
+        )
+        html = cache.read_blob(prev["content_hash"])
+        return FetchResult(url, html, prev["content_hash"], changed=False, status_code=304)
+
+    r.raise_for_status()
+    html = r.text
+    digest = cache.write_blob(html)
+    cache.update(url, digest, r.headers.get("ETag"), r.headers.get("Last-Modified"))
+    changed = prev is None or prev["content_hash"] != digest
+    return FetchResult(url, html, digest, changed=changed, status_code=r.status_code)
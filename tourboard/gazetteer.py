@@ -0,0 +1,120 @@
+from __future__ import annotations
+
+import re
+import threading
+import unicodedata
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+import pandas as pd
+import pycountry
+
+# Offline city -> (lat, lon) lookup, consulted before any online geocoder.
+# Built from GeoNames (CC BY 4.0) by scripts/build_gazetteer.py.
+GAZETTEER_PATH = Path(__file__).parent / "data" / "gazetteer.csv.gz"
+
+_PUNCT_RE = re.compile(r"[\s\-_.,]+")
+
+
+def normalise(s: str) -> str:
+    """Case-, accent- and punctuation-insensitive key: "São  Paulo" -> "sao paulo"."""
+    s = unicodedata.normalize("NFKD", s or "")
+    s = "".join(ch for ch in s if not unicodedata.combining(ch))
+    return _PUNCT_RE.sub(" ", s.casefold()).strip()
+
+
+# Names tour pages use for a country that are not its ISO name, keyed by
+# their normalise()d form. Constituent countries map to their sovereign
+# state, so "London, England" and "London, United Kingdom" are one place.
+COUNTRY_ALIASES = {
+    "england": "United Kingdom",
+    "scotland": "United Kingdom",
+    "wales": "United Kingdom",
+    "northern ireland": "United Kingdom",
+    "great britain": "United Kingdom",
+    "uk": "United Kingdom",
+    "u k": "United Kingdom",
+    "usa": "United States",
+    "us": "United States",
+    "u s": "United States",
+    "u s a": "United States",
+    "united states of america": "United States",
+    "holland": "Netherlands",
+    "the netherlands": "Netherlands",
+    "czech republic": "Czechia",
+    "south korea": "Korea, Republic of",
+    "korea": "Korea, Republic of",
+    "russia": "Russian Federation",
+    "turkey": "Türkiye",
+    "ivory coast": "Côte d'Ivoire",
+    "uae": "United Arab Emirates",
+}
+
+
+def canonical_country(country: str) -> str:
+    return COUNTRY_ALIASES.get(normalise(country), country or "")
+
+
+def place_key(city: str, country: str) -> str:
+    """Geocache key: "san jose|costa rica" for "San José" / "San Jose", "Costa Rica"."""
+    return f"{normalise(city)}|{normalise(canonical_country(country))}"
+
+
+@lru_cache(maxsize=1024)
+def country_code(country: str) -> Optional[str]:
+    """ISO 3166 alpha-2 for a country name, alias or code, None if unknown."""
+    country = canonical_country(country).strip()
+    if not country:
+        return None
+    try:
+        return pycountry.countries.lookup(country).alpha_2
+    except LookupError:
+        pass
+    try:
+        return pycountry.countries.search_fuzzy(country)[0].alpha_2
+    except LookupError:
+        return None
+
+
+class Gazetteer:
+    def __init__(self, path: Path = GAZETTEER_PATH):
+        self.path = Path(path)
+        self._by_country: Dict[Tuple[str, str], Tuple[float, float]] = {}
+        # name alone -> most populous match anywhere (for unknown countries)
+        self._by_name: Dict[str, Tuple[float, float]] = {}
+        self._load()
+
+    def _load(self) -> None:
+        if not self.path.exists():
+            return
+        df = pd.read_csv(self.path, keep_default_na=False, dtype={"key": str, "country_code": str})
+        coords = list(zip(df["lat"].tolist(), df["lon"].tolist()))
+        self._by_country = dict(zip(zip(df["key"].tolist(), df["country_code"].tolist()), coords))
+        biggest = df.sort_values("population").drop_duplicates("key", keep="last")
+        self._by_name = dict(zip(biggest["key"].tolist(), zip(biggest["lat"].tolist(), biggest["lon"].tolist())))
+
+    def __len__(self) -> int:
+        return len(self._by_country)
+
+    def lookup(self, city: str, country: str) -> Optional[Tuple[float, float]]:
+        key = normalise(city)
+        if not key:
+            return None
+        cc = country_code(country)
+        if cc is not None:
+            return self._by_country.get((key, cc))
+        return self._by_name.get(key)
+
+
+_gazetteer: Optional[Gazetteer] = None
+_lock = threading.Lock()
+
+
+def get_gazetteer() -> Gazetteer:
+    """Process-wide instance, loaded on first use."""
+    global _gazetteer
+    with _lock:
+        if _gazetteer is None:
+            _gazetteer = Gazetteer()
+        return _gazetteer
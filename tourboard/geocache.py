@@ -0,0 +1,105 @@
+from __future__ import annotations
+
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import pandas as pd
+from cachetools import LRUCache
+
+from tourboard.db import ERROR_TTL, MISS_TTL, geocache_get_many, geocache_set_many
+
+Coords = Optional[Tuple[float, float]]
+
+
+def _now_iso() -> str:
+    return datetime.now(timezone.utc).replace(microsecond=0).isoformat()
+
+
+class GeocacheStore:
+    """
+    Process-wide front for the `geocache` table.
+
+    get_many() answers from a bounded in-memory LRU and looks up everything
+    else with one IN (...) query. put() records a new lookup in the LRU
+    straight away and buffers the row; flush() writes the buffer in one
+    transaction. Remembered failures carry their expiry into the LRU, so a
+    "miss" / "error" is retried after its TTL here too. Thread-safe: the app
+    reads while the geocode worker writes.
+    """
+
+    def __init__(self, maxsize: int = 4096):
+        self._lru: "LRUCache[str, Tuple[Coords, Optional[str]]]" = LRUCache(maxsize=maxsize)
+        self._buffer: List[Tuple] = []
+        self._lock = threading.Lock()
+
+    def _cached(self, key: str, now: str):
+        hit = self._lru.get(key)
+        if hit is None:
+            return None
+        if hit[1] is not None and hit[1] <= now:
+            del self._lru[key]
+            return None
+        return hit
+
+    def get_many(self, conn: sqlite3.Connection, keys: Iterable[str]) -> Dict[str, Coords]:
+        """
+        {key: (lat, lon), or None for a remembered failure} for the cached
+        keys among `keys`; keys nobody has looked up yet are left out.
+        """
+        now = _now_iso()
+        out: Dict[str, Coords] = {}
+        todo = []
+        with self._lock:
+            for key in dict.fromkeys(keys):
+                hit = self._cached(key, now)
+                if hit is None:
+                    todo.append(key)
+                else:
+                    out[key] = hit[0]
+        if not todo:
+            return out
+        rows = geocache_get_many(conn, todo)
+        with self._lock:
+            for key, (lat, lon, expires_at) in rows.items():
+                coords = None if lat is None else (float(lat), float(lon))
+                self._lru[key] = (coords, expires_at)
+                out[key] = coords
+        return out
+
+    def get_frame(self, conn: sqlite3.Connection, keys: Iterable[str]) -> pd.DataFrame:
+        """The places among `keys` with coordinates, as (key, lat, lon) for geocode.fill_coordinates."""
+        found = self.get_many(conn, keys)
+        return pd.DataFrame([(k, c[0], c[1]) for k, c in found.items() if c], columns=["key", "lat", "lon"])
+
+    def put(
+        self, key: str, city: str, country: str, coords: Coords, provider: str = "nominatim", status: str = "ok"
+    ) -> None:
+        """Record a lookup now; it reaches SQLite on the next flush()."""
+        lat, lon = coords or (None, None)
+        expires_at = None
+        if status != "ok":
+            ttl = MISS_TTL if status == "miss" else ERROR_TTL
+            expires_at = (datetime.now(timezone.utc).replace(microsecond=0) + ttl).isoformat()
+        with self._lock:
+            self._lru[key] = (coords if status == "ok" else None, expires_at)
+            self._buffer.append((key, city, country, lat, lon, provider, status))
+
+    @property
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._buffer)
+
+    def flush(self, conn: sqlite3.Connection) -> int:
+        """Write the buffered lookups in one transaction; returns how many."""
+        with self._lock:
+            rows, self._buffer = self._buffer, []
+        if rows:
+            try:
+                geocache_set_many(conn, rows)
+            except Exception:
+                with self._lock:
+                    self._buffer[:0] = rows
+                raise
+        return len(rows)
@@ -1,40 +1,95 @@
 from __future__ import annotations
 
-import time
-from typing import Optional, Tuple
+from typing import TYPE_CHECKING, Dict, Optional, Tuple
 
+import pandas as pd
+from geopy.adapters import RequestsAdapter
 from geopy.geocoders import Nominatim
 from geopy.exc import GeocoderTimedOut, GeocoderServiceError
 
-from tourboard.db import geocache_get, geocache_set
+from tourboard.gazetteer import place_key
+from tourboard.transport import wrap
+
+if TYPE_CHECKING:
+    from tourboard.geoworker import GeocodeWorker
+
+
+class TransportAdapter(RequestsAdapter):
+    """geopy adapter whose HTTP calls go through tourboard.transport (live / record / replay)."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.session = wrap(self.session)
 
 
 # Nominatim requires a real-ish user agent string
-_geocoder = Nominatim(user_agent="dtmf-tourboard/1.0 (personal project)")
+_geocoder = Nominatim(user_agent="dtmf-tourboard/1.0 (personal project)", adapter_factory=TransportAdapter)
 
 
-def geocode_city_country(conn, city: str, country: str, sleep_sec: float = 1.0) -> Optional[Tuple[float, float]]:
+def query_nominatim(city: str, country: str) -> Tuple[str, Optional[Tuple[float, float]]]:
     """
-    Returns (lat, lon) for a city,country, using SQLite cache first.
-    sleep_sec helps respect Nominatim rate limits.
+    One Nominatim lookup, no caching and no rate limiting (callers own
+    that). Returns ("ok", (lat, lon)), ("miss", None) or ("error", None).
     """
-    if not city or not country:
-        return None
+    try:
+        loc = _geocoder.geocode(f"{city}, {country}", timeout=10)
+    except (GeocoderTimedOut, GeocoderServiceError):
+        return "error", None
+    if not loc:
+        return "miss", None
+    return "ok", (float(loc.latitude), float(loc.longitude))
 
-    key = f"{city.strip().lower()}|{country.strip().lower()}"
-    cached = geocache_get(conn, key)
-    if cached:
-        return float(cached[0]), float(cached[1])
 
-    query = f"{city}, {country}"
+def coordinates_frame(places: Dict[Tuple[str, str], Optional[Tuple[float, float]]]) -> pd.DataFrame:
+    """{(city, country): (lat, lon) or None} as a (key, lat, lon) frame for fill_coordinates."""
+    return pd.DataFrame(
+        [(place_key(city, country), c[0], c[1]) for (city, country), c in places.items() if c],
+        columns=["key", "lat", "lon"],
+    )
 
-    try:
-        loc = _geocoder.geocode(query, timeout=10)
-        time.sleep(sleep_sec)  # be kind to the free service
-        if not loc:
-            return None
-        lat, lon = float(loc.latitude), float(loc.longitude)
-        geocache_set(conn, key, city, country, lat, lon)
-        return lat, lon
-    except (GeocoderTimedOut, GeocoderServiceError):
-        return None
+
+def fill_coordinates(events: pd.DataFrame, coords: pd.DataFrame) -> pd.DataFrame:
+    """
+    Copy of `events` with lat / lon taken from `coords` (key, lat, lon, e.g.
+    GeocacheStore.get_frame) wherever a row has none yet. One merge on the place
+    key; place_key itself runs once per distinct place, not per row.
+    """
+    out = events.copy()
+    for col in ("lat", "lon"):
+        out[col] = out[col].astype("float64") if col in out.columns else float("nan")
+    places = out[["city", "country"]].astype(object).dropna().drop_duplicates()
+    places["key"] = [place_key(city, country) for city, country in places.itertuples(index=False, name=None)]
+    found = (
+        out[["city", "country"]].astype(object)
+        .merge(places, on=["city", "country"], how="left")
+        .merge(coords[["key", "lat", "lon"]].drop_duplicates("key"), on="key", how="left")
+    )
+    for col in ("lat", "lon"):
+        out[col] = out[col].fillna(pd.Series(found[col].to_numpy(dtype="float64"), index=out.index))
+    return out
+
+
+def attach_coordinates(
+    events: pd.DataFrame,
+    worker: "GeocodeWorker",
+    previous: Optional[pd.DataFrame] = None,
+    timeout: Optional[float] = None,
+) -> pd.DataFrame:
+    """
+    Copy of `events` with lat / lon columns (NaN where a place can't be
+    found). Places that already have coordinates in `previous` (the last
+    published frame) keep them without a lookup; the rest are handed to the
+    background `worker` and waited for. Run by the updater, never at page
+    render.
+    """
+    out = events.drop(columns=["lat", "lon"], errors="ignore")
+    known = {}
+    if previous is not None and {"city", "country", "lat", "lon"} <= set(previous.columns):
+        prev = previous.dropna(subset=["city", "country", "lat", "lon"])
+        for city, country, lat, lon in prev[["city", "country", "lat", "lon"]].itertuples(index=False, name=None):
+            known.setdefault((city, country), (float(lat), float(lon)))
+
+    places = out[["city", "country"]].dropna().drop_duplicates().itertuples(index=False, name=None)
+    worker.submit(p for p in places if p not in known)
+    worker.wait(timeout)
+    return fill_coordinates(out, coordinates_frame({**worker.known(), **known}))
@@ -0,0 +1,217 @@
+from __future__ import annotations
+
+import queue
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from tourboard.db import ERROR_TTL, get_conn, init_db
+from tourboard.gazetteer import get_gazetteer, place_key
+from tourboard.geocache import Coords, GeocacheStore
+from tourboard.geocode import query_nominatim
+
+Place = Tuple[str, str]
+
+# How long the worker takes a failed place as settled before a submit() may
+# queue it again. The shortest geocache TTL: asking again goes through the
+# geocache, which answers with the stored failure until its own expiry.
+FAILURE_TTL = ERROR_TTL.total_seconds()
+
+
+class TokenBucket:
+    """
+    `rate` tokens per second, at most `capacity` saved up; acquire() blocks
+    until one is available. Nominatim's usage policy is an absolute maximum
+    of one request per second, hence the defaults: no bursts.
+    """
+
+    def __init__(self, rate: float = 1.0, capacity: float = 1.0):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._stamp = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._stamp) * self.rate)
+                self._stamp = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class GeocodeWorker:
+    """
+    Geocoding off the caller's thread.
+
+    Places are queued with submit() and resolved by a daemon thread, up to
+    `batch_size` at a time: one geocache read for the batch (through
+    `store`, a GeocacheStore that may be shared with the app), then the
+    gazetteer, then Nominatim behind a token bucket. New lookups go into
+    the store and are flushed to SQLite in one transaction per batch, or
+    after `flush_interval` seconds while Nominatim is slow, over the
+    worker's own connection. Callers never block on it: they poll known()
+    and pending, or wait() when they have nothing else to do (the updater).
+    """
+
+    def __init__(
+        self,
+        db_path: Optional[Path] = None,
+        store: Optional[GeocacheStore] = None,
+        rate: float = 1.0,
+        batch_size: int = 25,
+        flush_interval: float = 2.0,
+    ):
+        self.db_path = db_path
+        self.store = store or GeocacheStore()
+        self.bucket = TokenBucket(rate)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: "queue.Queue[Optional[Place]]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        # place -> (coords, monotonic time after which a failure may be retried; None for hits)
+        self._known: Dict[Place, Tuple[Coords, Optional[float]]] = {}
+        self._queued: set = set()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _settled(self, place: Place, now: float) -> bool:
+        hit = self._known.get(place)
+        return hit is not None and (hit[1] is None or hit[1] > now)
+
+    def submit(self, places: Iterable[Place]) -> int:
+        """Queue the places not queued or settled yet (see FAILURE_TTL); returns how many were added."""
+        added = 0
+        now = time.monotonic()
+        with self._lock:
+            for city, country in places:
+                place = (city, country)
+                if not city or not country or self._settled(place, now) or place in self._queued:
+                    continue
+                self._queued.add(place)
+                self._queue.put(place)
+                added += 1
+            if added and (self._thread is None or not self._thread.is_alive()):
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name="geocode-worker", daemon=True)
+                self._thread.start()
+        return added
+
+    @property
+    def pending(self) -> int:
+        """Places queued or resolved but not yet written to the geocache."""
+        with self._lock:
+            return len(self._queued)
+
+    def known(self) -> Dict[Place, Coords]:
+        """Every place resolved so far: (lat, lon), or None where the lookup failed (until FAILURE_TTL)."""
+        now = time.monotonic()
+        with self._lock:
+            return {place: coords for place, (coords, _) in self._known.items() if self._settled(place, now)}
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Block until everything submitted is resolved and written; False on timeout."""
+        with self._idle:
+            return self._idle.wait_for(lambda: not self._queued, timeout)
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """Stop after the place in hand; whatever was resolved is still written."""
+        self._stop.set()
+        self._queue.put(None)  # wake the thread if it is waiting for work
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    # -- worker thread --------------------------------------------------
+
+    def _lookup(self, city: str, country: str, key: str) -> Coords:
+        """A place the geocache does not know: gazetteer, else Nominatim at the bucket's pace."""
+        hit = get_gazetteer().lookup(city, country)
+        if hit:
+            self.store.put(key, city, country, hit, provider="gazetteer")
+            return hit
+        self.bucket.acquire()
+        status, coords = query_nominatim(city, country)
+        self.store.put(key, city, country, coords, status=status)
+        return coords
+
+    def _flush(self, conn, done: List[Place]) -> None:
+        try:
+            self.store.flush(conn)
+        finally:
+            with self._idle:
+                self._queued.difference_update(done)
+                self._idle.notify_all()
+            done.clear()
+
+    def _next_batch(self) -> List[Place]:
+        try:
+            batch = [self._queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return [p for p in batch if p is not None]
+
+    def _run(self) -> None:
+        conn = None
+        done: List[Place] = []
+        idle = False
+        try:
+            conn = get_conn(self.db_path)
+            init_db(conn)
+            while not self._stop.is_set():
+                batch = self._next_batch()
+                if not batch:
+                    with self._lock:
+                        if self._queue.empty():
+                            # nothing to do: let the next submit() start a fresh thread
+                            self._thread = None
+                            idle = True
+                            break
+                    continue
+                keys = {place: place_key(*place) for place in batch}
+                cached = self.store.get_many(conn, keys.values())
+                last_flush = time.monotonic()
+                for place in batch:
+                    if self._stop.is_set():
+                        break
+                    key = keys[place]
+                    if key in cached:
+                        coords = cached[key]
+                    else:
+                        try:
+                            coords = self._lookup(*place, key)
+                        except Exception:
+                            coords = None  # treated as not found until FAILURE_TTL
+                    with self._lock:
+                        self._known[place] = (coords, None if coords else time.monotonic() + FAILURE_TTL)
+                    done.append(place)
+                    if time.monotonic() - last_flush >= self.flush_interval:
+                        self._flush(conn, done)
+                        last_flush = time.monotonic()
+                self._flush(conn, done)
+        finally:
+            try:
+                if done and conn is not None:
+                    self._flush(conn, done)
+            finally:
+                if conn is not None:
+                    conn.close()
+                if not idle:
+                    # stopped (or failed): drop what is still queued, submit() may queue it again
+                    with self._idle:
+                        while not self._queue.empty():
+                            self._queue.get_nowait()
+                        self._queued.clear()
+                        self._thread = None
+                        self._idle.notify_all()
@@ -0,0 +1,220 @@
+from __future__ import annotations
+
+import sqlite3
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import pandas as pd
+
+from tourboard.changes import EventChanges, content_hash, diff_events, event_key
+from tourboard.schema import apply_event_schema
+
+# History lives next to the latest-only `events` table (schema in
+# tourboard.migrations):
+#
+#   scrapes         one row per recorded scrape of a tour page
+#   event_versions  a row each time a stop appears, changes or disappears
+#                   (removed=1); a stop's state as of scrape X is its newest
+#                   version at or before X
+#   rollups         gross / tickets / shows / runs per (scrape, level, key),
+#                   carried forward from the previous scrape and adjusted by
+#                   the changed stops only, so recording a scrape never
+#                   rescans history
+#
+# Scrapes of one page must be recorded in scraped_at order; backfills replay
+# the archive oldest first.
+
+ROLLUP_LEVELS = ("tour", "region", "country", "venue")
+ROLLUP_MEASURES = ("gross_usd", "tickets", "shows", "runs")
+
+VERSION_COLUMNS = [
+    "source_url", "event_key", "scraped_at", "removed", "content_hash",
+    "region", "date_range", "start_date", "end_date", "artist", "venue", "city", "country",
+    "gross_usd", "tickets", "capacity_pct", "shows",
+]
+
+
+def _num(v) -> float:
+    try:
+        v = float(v)
+    except (TypeError, ValueError):
+        return 0.0
+    return 0.0 if v != v else v
+
+
+def _group_keys(ev: Dict) -> List[Tuple[str, str]]:
+    out = [("tour", "")]
+    for level in ROLLUP_LEVELS[1:]:
+        v = ev.get(level)
+        out.append((level, "" if v is None or v != v else str(v)))
+    return out
+
+
+def _contribution(ev: Dict, sign: int, into: Dict[Tuple[str, str], List[float]]) -> None:
+    values = (_num(ev.get("gross_usd")), _num(ev.get("tickets")), _num(ev.get("shows")), 1.0)
+    for g in _group_keys(ev):
+        acc = into[g]
+        for i, v in enumerate(values):
+            acc[i] += sign * v
+
+
+def last_scrape(conn: sqlite3.Connection, source_url: str, before: Optional[str] = None) -> Optional[str]:
+    q = "SELECT MAX(scraped_at) FROM scrapes WHERE source_url = ?"
+    args: list = [source_url]
+    if before is not None:
+        q += " AND scraped_at <= ?"
+        args.append(before)
+    return conn.execute(q, args).fetchone()[0]
+
+
+def _state(conn: sqlite3.Connection, as_of: str, source_url: Optional[str] = None) -> pd.DataFrame:
+    """Newest non-removed version of every stop at or before `as_of`."""
+    q = """
+    SELECT v.* FROM event_versions v
+    JOIN (
+        SELECT source_url, event_key, MAX(scraped_at) AS scraped_at
+        FROM event_versions
+        WHERE scraped_at <= :as_of {url_filter}
+        GROUP BY source_url, event_key
+    ) latest USING (source_url, event_key, scraped_at)
+    WHERE v.removed = 0
+    """.format(url_filter="AND source_url = :url" if source_url else "")
+    return pd.read_sql_query(q, conn, params={"as_of": as_of, "url": source_url})
+
+
+def record_scrape(conn: sqlite3.Connection, source_url: str, scraped_at: str, events: Iterable[Dict]) -> EventChanges:
+    """
+    Record one scrape of a tour page: new event versions for whatever was
+    inserted / changed / removed since the previous recorded scrape, and the
+    rollups for this scrape. Re-recording an already recorded scrape is a
+    no-op; recording one older than the newest raises ValueError.
+    """
+    prev_at = last_scrape(conn, source_url)
+    if prev_at is not None and scraped_at <= prev_at:
+        if scraped_at == prev_at:
+            return EventChanges()
+        raise ValueError(
+            f"{source_url}: scrape {scraped_at} is older than the last recorded one ({prev_at}); "
+            "rebuild the history instead (scripts/backfill.py --db)"
+        )
+
+    current = []
+    for ev in events:
+        ev = dict(ev, source_url=source_url, scraped_at=scraped_at)
+        ev.setdefault("event_key", event_key(ev))
+        ev.setdefault("content_hash", content_hash(ev))
+        current.append(ev)
+    previous = _state(conn, prev_at, source_url).to_dict("records") if prev_at else []
+    changes = diff_events(previous, current)
+    old_by_key = {ev["event_key"]: ev for ev in previous}
+
+    delta: Dict[Tuple[str, str], List[float]] = defaultdict(lambda: [0.0] * len(ROLLUP_MEASURES))
+    versions = []
+    for ev in changes.inserted:
+        _contribution(ev, +1, delta)
+        versions.append(dict(ev, removed=0))
+    for ev in changes.changed:
+        _contribution(old_by_key[ev["event_key"]], -1, delta)
+        _contribution(ev, +1, delta)
+        versions.append(dict(ev, removed=0))
+    for ev in changes.removed:
+        _contribution(ev, -1, delta)
+        versions.append(dict(ev, scraped_at=scraped_at, removed=1))
+
+    totals: Dict[Tuple[str, str], List[float]] = {}
+    if prev_at:
+        for level, key, *measures in conn.execute(
+            f"SELECT level, key, {', '.join(ROLLUP_MEASURES)} FROM rollups WHERE source_url = ? AND scraped_at = ?",
+            (source_url, prev_at),
+        ):
+            totals[(level, key)] = [m or 0.0 for m in measures]
+    for g, d in delta.items():
+        acc = totals.setdefault(g, [0.0] * len(ROLLUP_MEASURES))
+        for i, v in enumerate(d):
+            acc[i] += v
+
+    rollup_rows = [
+        (source_url, scraped_at, level, key, round(m[0], 2), int(round(m[1])), int(round(m[2])), int(round(m[3])))
+        for (level, key), m in totals.items()
+        if round(m[3]) > 0
+    ]
+
+    cols = ", ".join(VERSION_COLUMNS)
+    marks = ", ".join("?" for _ in VERSION_COLUMNS)
+    with conn:
+        conn.execute(
+            "INSERT INTO scrapes (source_url, scraped_at, events, inserted, changed, removed) VALUES (?, ?, ?, ?, ?, ?)",
+            (source_url, scraped_at, len(current), len(changes.inserted), len(changes.changed), len(changes.removed)),
+        )
+        conn.executemany(
+            f"INSERT INTO event_versions ({cols}) VALUES ({marks})",
+            [tuple(_sql_value(v.get(c)) for c in VERSION_COLUMNS) for v in versions],
+        )
+        conn.executemany(
+            f"INSERT INTO rollups (source_url, scraped_at, level, key, {', '.join(ROLLUP_MEASURES)}) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            rollup_rows,
+        )
+    return changes
+
+
+def clear_history(conn: sqlite3.Connection, source_url: Optional[str] = None) -> None:
+    """Drop recorded history (for one page, or all) before replaying it."""
+    where, args = ("WHERE source_url = ?", (source_url,)) if source_url else ("", ())
+    with conn:
+        for table in ("scrapes", "event_versions", "rollups"):
+            conn.execute(f"DELETE FROM {table} {where}", args)
+
+
+def _sql_value(v):
+    if hasattr(v, "item") and not isinstance(v, str):
+        v = v.item()
+    if isinstance(v, float) and v != v:
+        return None
+    return v
+
+
+def list_scrapes(conn: sqlite3.Connection, source_url: Optional[str] = None) -> pd.DataFrame:
+    q = "SELECT * FROM scrapes"
+    if source_url:
+        q += " WHERE source_url = :url"
+    return pd.read_sql_query(q + " ORDER BY scraped_at", conn, params={"url": source_url})
+
+
+def events_as_of(conn: sqlite3.Connection, scraped_at: str, source_url: Optional[str] = None) -> pd.DataFrame:
+    """The tour's stops as they stood at `scraped_at` (any timestamp; the last scrape at or before it)."""
+    df = _state(conn, scraped_at, source_url)
+    return apply_event_schema(df.drop(columns=["removed"]))
+
+
+def rollup_as_of(
+    conn: sqlite3.Connection, level: str, scraped_at: Optional[str] = None, source_url: Optional[str] = None
+) -> pd.DataFrame:
+    """Rollup rows for `level` from each page's last scrape at or before `scraped_at` (default: latest)."""
+    if level not in ROLLUP_LEVELS:
+        raise ValueError(f"Unknown rollup level {level!r} (expected one of {ROLLUP_LEVELS})")
+    q = """
+    SELECT r.* FROM rollups r
+    JOIN (
+        SELECT source_url, MAX(scraped_at) AS scraped_at FROM scrapes
+        WHERE (:as_of IS NULL OR scraped_at <= :as_of) AND (:url IS NULL OR source_url = :url)
+        GROUP BY source_url
+    ) s USING (source_url, scraped_at)
+    WHERE r.level = :level
+    ORDER BY r.gross_usd DESC
+    """
+    return pd.read_sql_query(q, conn, params={"as_of": scraped_at, "url": source_url, "level": level})
+
+
+def rollup_series(
+    conn: sqlite3.Connection, level: str = "tour", key: Optional[str] = None, source_url: Optional[str] = None
+) -> pd.DataFrame:
+    """One row per scrape (and key) for `level`, oldest first: how the numbers evolved."""
+    if level not in ROLLUP_LEVELS:
+        raise ValueError(f"Unknown rollup level {level!r} (expected one of {ROLLUP_LEVELS})")
+    q = """
+    SELECT * FROM rollups
+    WHERE level = :level AND (:key IS NULL OR key = :key) AND (:url IS NULL OR source_url = :url)
+    ORDER BY scraped_at, key
+    """
+    return pd.read_sql_query(q, conn, params={"level": level, "key": key, "url": source_url})
@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+# Everything the dashboard reports about the current stops, computed from
+# one typed events frame (tourboard.schema + dates.add_run_dates): headline
+# KPIs column-wise, and every per-country figure in a single groupby.
+
+# Per-country columns (TourMetrics.countries). "reported" = gross is
+# published; revenue per show only counts stops with gross and shows > 0,
+# the average price only stops with gross and tickets > 0.
+COUNTRY_COLUMNS = [
+    "country", "runs", "gross_usd", "tickets", "shows", "reported_runs", "reported_shows",
+    "rps_gross_usd", "rps_shows", "revenue_per_show_usd",
+    "priced_gross_usd", "priced_tickets", "avg_price_usd",
+]
+
+
+@dataclass
+class TourMetrics:
+    reported_revenue: Optional[float] = None
+    reported_tickets: Optional[int] = None
+    avg_price: Optional[float] = None
+    total_shows: int = 0
+    reported_shows: int = 0
+    total_countries: int = 0  # countries with at least one reported stop
+    last_updated: Optional[str] = None
+    current_stop: Optional[Dict] = None  # earliest run under way today
+    next_stop: Optional[Dict] = None  # earliest run starting after today
+    latest_report: Optional[Dict] = None  # most recent stop with gross and tickets
+    countries: pd.DataFrame = field(default_factory=lambda: pd.DataFrame(columns=COUNTRY_COLUMNS))
+
+    @property
+    def total_reports_text(self) -> str:
+        return f"{self.reported_shows} / {self.total_shows} shows reported"
+
+
+def stop_status(events: pd.DataFrame, today: pd.Timestamp) -> np.ndarray:
+    """"Current stop" / "Happened" / "Upcoming" per row; rows without both dates are "Upcoming"."""
+    start, end = events["start_dt"], events["end_dt"]
+    dated = start.notna() & end.notna()
+    return np.select(
+        [dated & (start <= today) & (today <= end), dated & (end < today)],
+        ["Current stop", "Happened"],
+        default="Upcoming",
+    )
+
+
+def _row(events: pd.DataFrame, mask: pd.Series, by: pd.Series, newest: bool = False) -> Optional[Dict]:
+    if not mask.any():
+        return None
+    keys = by[mask]
+    return events.loc[keys.idxmax() if newest else keys.idxmin()].to_dict()
+
+
+def country_metrics(events: pd.DataFrame) -> pd.DataFrame:
+    """Per-country totals and ratios (COUNTRY_COLUMNS), one groupby over the stops with a country."""
+    gross = events["gross_usd"].astype("float64")
+    tickets = events["tickets"].astype("float64")
+    shows = events["shows"].astype("float64")
+    reported = gross.notna()
+    rps = reported & (gross > 0) & (shows > 0)
+    priced = reported & (tickets > 0)
+
+    parts = pd.DataFrame({
+        "country": events["country"],
+        "runs": 1,
+        "gross_usd": gross,
+        "tickets": tickets,
+        "shows": shows,
+        "reported_runs": reported.astype("int64"),
+        "reported_shows": shows.where(reported),
+        "rps_gross_usd": gross.where(rps),
+        "rps_shows": shows.where(rps),
+        "priced_gross_usd": gross.where(priced),
+        "priced_tickets": tickets.where(priced),
+    })
+    out = parts.groupby("country", observed=True, sort=True).sum(min_count=1).reset_index()
+
+    out["revenue_per_show_usd"] = out["rps_gross_usd"] / out["rps_shows"]
+    out["avg_price_usd"] = out["priced_gross_usd"] / out["priced_tickets"]
+    for col in ("tickets", "shows", "reported_shows", "rps_shows", "priced_tickets"):
+        out[col] = out[col].round().astype("Int64")
+    out["country"] = out["country"].astype(object)
+    return out[COUNTRY_COLUMNS]
+
+
+def tour_metrics(events: pd.DataFrame, today: pd.Timestamp) -> TourMetrics:
+    """Headline KPIs, tour status and per-country aggregates for the page."""
+    gross = events["gross_usd"]
+    tickets = events["tickets"]
+    shows = events["shows"].fillna(0)
+    reported = gross.notna()
+
+    revenue = float(gross.sum()) if reported.any() else None
+    sold = int(tickets.sum()) if tickets.notna().any() else None
+    countries = country_metrics(events)
+
+    start, end = events["start_dt"], events["end_dt"]
+    current = start.notna() & end.notna() & (start <= today) & (today <= end)
+    upcoming = start.notna() & (start > today)
+    with_report = reported & tickets.notna() & start.notna()
+
+    scraped = events["scraped_at"].dropna() if "scraped_at" in events.columns else pd.Series(dtype=object)
+
+    return TourMetrics(
+        reported_revenue=revenue,
+        reported_tickets=sold,
+        avg_price=(revenue / sold) if (revenue is not None and sold) else None,
+        total_shows=int(shows.sum()),
+        reported_shows=int(shows[reported].sum()),
+        total_countries=int((countries["reported_runs"] > 0).sum()),
+        last_updated=scraped.max() if not scraped.empty else None,
+        current_stop=_row(events, current, start),
+        next_stop=_row(events, upcoming, start),
+        latest_report=_row(events, with_report, end.fillna(start), newest=True),
+        countries=countries,
+    )
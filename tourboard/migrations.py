@@ -0,0 +1,292 @@
+from __future__ import annotations
+
+import re
+import sqlite3
+import unicodedata
+from typing import Callable, List
+
+# Schema versions are tracked in PRAGMA user_version: a database at version N
+# has had MIGRATIONS[:N] applied. Steps only ever get appended; never edit or
+# reorder one that has shipped. Each step is written to also be safe on
+# databases created before versioning existed (user_version 0 but tables
+# already there), so those are adopted in place.
+
+# must match tourboard.changes.event_key
+EVENT_KEY_SQL = "COALESCE(date_range, '') || '|' || COALESCE(venue, '') || '|' || COALESCE(city, '')"
+
+
+def _columns(conn: sqlite3.Connection, table: str) -> set:
+    return {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+
+
+def _add_columns(conn: sqlite3.Connection, table: str, columns: dict) -> None:
+    existing = _columns(conn, table)
+    for col, col_type in columns.items():
+        if col not in existing:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {col} {col_type};")
+
+
+def _base_tables(conn: sqlite3.Connection) -> None:
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS snapshots (
+            scraped_at TEXT,
+            source_url TEXT,
+            reported_revenue_usd REAL,
+            reported_tickets INTEGER,
+            avg_price_usd REAL,
+            total_reports_text TEXT
+        )
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS events (
+            region TEXT,
+            date_range TEXT,
+            start_date TEXT,
+            end_date TEXT,
+            artist TEXT,
+            venue TEXT,
+            city TEXT,
+            country TEXT,
+            gross_usd REAL,
+            tickets INTEGER,
+            capacity_pct REAL,
+            shows INTEGER,
+            source_url TEXT,
+            scraped_at TEXT
+        )
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS geocache (
+            key TEXT PRIMARY KEY,
+            city TEXT,
+            country TEXT,
+            lat REAL,
+            lon REAL,
+            provider TEXT,
+            updated_at TEXT
+        )
+        """
+    )
+
+
+def _snapshot_averages(conn: sqlite3.Connection) -> None:
+    _add_columns(conn, "snapshots", {
+        "scraped_at": "TEXT",
+        "reported_revenue_usd": "REAL",
+        "reported_tickets": "INTEGER",
+        "avg_revenue_usd": "REAL",
+        "avg_tickets": "INTEGER",
+        "avg_price_usd": "REAL",
+        "total_reports_text": "TEXT",
+        "source_url": "TEXT",
+    })
+
+
+def _keyed_events(conn: sqlite3.Connection) -> None:
+    """
+    Events from the append-only days to one row per (source_url, event_key),
+    the most recent scrape winning, plus indexes and the latest_scrape pointer.
+    """
+    _add_columns(conn, "events", {"event_key": "TEXT", "content_hash": "TEXT"})
+    conn.execute(f"UPDATE events SET event_key = {EVENT_KEY_SQL} WHERE event_key IS NULL")
+    conn.execute(
+        """
+        DELETE FROM events WHERE rowid NOT IN (
+            SELECT rowid FROM (
+                SELECT rowid, ROW_NUMBER() OVER (
+                    PARTITION BY source_url, event_key
+                    ORDER BY scraped_at DESC, rowid DESC
+                ) AS rn
+                FROM events
+            ) WHERE rn = 1
+        )
+        """
+    )
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS ux_events_key ON events(source_url, event_key)")
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_events_scraped_at ON events(scraped_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_events_url_scraped_at ON events(source_url, scraped_at)")
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS latest_scrape (
+            source_url TEXT PRIMARY KEY,
+            scraped_at TEXT
+        )
+        """
+    )
+    conn.execute(
+        """
+        INSERT OR REPLACE INTO latest_scrape (source_url, scraped_at)
+        SELECT source_url, MAX(scraped_at) FROM events GROUP BY source_url
+        """
+    )
+
+
+def _history(conn: sqlite3.Connection) -> None:
+    """Event versions and per-scrape rollups, see tourboard.history."""
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS scrapes (
+            source_url TEXT NOT NULL,
+            scraped_at TEXT NOT NULL,
+            events INTEGER,
+            inserted INTEGER,
+            changed INTEGER,
+            removed INTEGER,
+            PRIMARY KEY (source_url, scraped_at)
+        )
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS event_versions (
+            source_url TEXT NOT NULL,
+            event_key TEXT NOT NULL,
+            scraped_at TEXT NOT NULL,
+            removed INTEGER NOT NULL DEFAULT 0,
+            content_hash TEXT,
+            region TEXT,
+            date_range TEXT,
+            start_date TEXT,
+            end_date TEXT,
+            artist TEXT,
+            venue TEXT,
+            city TEXT,
+            country TEXT,
+            gross_usd REAL,
+            tickets INTEGER,
+            capacity_pct REAL,
+            shows INTEGER,
+            PRIMARY KEY (source_url, event_key, scraped_at)
+        )
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS rollups (
+            source_url TEXT NOT NULL,
+            scraped_at TEXT NOT NULL,
+            level TEXT NOT NULL,
+            key TEXT NOT NULL,
+            gross_usd REAL,
+            tickets INTEGER,
+            shows INTEGER,
+            runs INTEGER,
+            PRIMARY KEY (source_url, scraped_at, level, key)
+        )
+        """
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_rollups_series ON rollups(level, key, scraped_at)")
+
+
+# tourboard.gazetteer.place_key as it was when _geocache_negative_and_rekey
+# shipped, frozen so later changes to the key (or the aliases) cannot change
+# what that step does to a database upgraded after them
+_PLACE_KEY_PUNCT_RE = re.compile(r"[\s\-_.,]+")
+_PLACE_KEY_COUNTRY_ALIASES = {
+    "england": "United Kingdom",
+    "scotland": "United Kingdom",
+    "wales": "United Kingdom",
+    "northern ireland": "United Kingdom",
+    "great britain": "United Kingdom",
+    "uk": "United Kingdom",
+    "u k": "United Kingdom",
+    "usa": "United States",
+    "us": "United States",
+    "u s": "United States",
+    "u s a": "United States",
+    "united states of america": "United States",
+    "holland": "Netherlands",
+    "the netherlands": "Netherlands",
+    "czech republic": "Czechia",
+    "south korea": "Korea, Republic of",
+    "korea": "Korea, Republic of",
+    "russia": "Russian Federation",
+    "turkey": "Türkiye",
+    "ivory coast": "Côte d'Ivoire",
+    "uae": "United Arab Emirates",
+}
+
+
+def _place_key_v1(city: str, country: str) -> str:
+    def norm(s: str) -> str:
+        s = unicodedata.normalize("NFKD", s or "")
+        s = "".join(ch for ch in s if not unicodedata.combining(ch))
+        return _PLACE_KEY_PUNCT_RE.sub(" ", s.casefold()).strip()
+
+    country = _PLACE_KEY_COUNTRY_ALIASES.get(norm(country), country or "")
+    return f"{norm(city)}|{norm(country)}"
+
+
+def _geocache_negative_and_rekey(conn: sqlite3.Connection) -> None:
+    """
+    Negative entries (status 'miss' / 'error' with an expiry) and keys from
+    place_key (as frozen in _place_key_v1), which folds accents and country
+    aliases. Rows that now share a key collapse to one, preferring a real
+    hit and then the most recent.
+    """
+    _add_columns(conn, "geocache", {"status": "TEXT NOT NULL DEFAULT 'ok'", "expires_at": "TEXT"})
+    rows = conn.execute(
+        "SELECT key, city, country, lat, lon, provider, updated_at, status, expires_at FROM geocache"
+    ).fetchall()
+    best = {}
+    for row in rows:
+        key, city, country = row[:3]
+        new_key = _place_key_v1(city, country) if city and country else key
+        rank = (row[3] is not None, row[6] or "")
+        if new_key not in best or rank > best[new_key][0]:
+            best[new_key] = (rank, (new_key, *row[1:]))
+    conn.execute("DELETE FROM geocache")
+    conn.executemany(
+        "INSERT INTO geocache (key, city, country, lat, lon, provider, updated_at, status, expires_at) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        [r for _, r in best.values()],
+    )
+
+
+MIGRATIONS: List[Callable[[sqlite3.Connection], None]] = [
+    _base_tables,
+    _snapshot_averages,
+    _keyed_events,
+    _history,
+    _geocache_negative_and_rekey,
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def schema_version(conn: sqlite3.Connection) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn: sqlite3.Connection) -> int:
+    """
+    Bring the database up to SCHEMA_VERSION and return the version.
+
+    An up-to-date database costs one PRAGMA read. Otherwise the pending steps
+    run in one write transaction, so a failed step leaves the old version in
+    place, and a second process migrating at the same time waits for the
+    lock and then finds nothing left to do.
+    """
+    version = schema_version(conn)
+    if version >= SCHEMA_VERSION:
+        return version
+
+    if conn.in_transaction:
+        conn.commit()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        version = schema_version(conn)  # may have moved while we waited
+        for step in MIGRATIONS[version:]:
+            step(conn)
+        if version < SCHEMA_VERSION:
+            conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return max(version, SCHEMA_VERSION)
@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, List, Optional
+
+from tourboard.db import DB_PATH, apply_pragmas, get_conn, init_db
+
+
+class ConnectionPool:
+    """
+    Process-wide SQLite access for the app.
+
+    The schema is set up once, on first use, instead of on every rerun.
+    Reads borrow from a small pool of query-only connections (WAL lets them
+    run alongside the writer); writes go through a single connection
+    guarded by a lock, committed on success and rolled back on error.
+    Connections are shared across Streamlit's script threads, hence
+    check_same_thread=False.
+    """
+
+    def __init__(self, db_path: Optional[Path] = None, max_readers: int = 4, timeout: float = 30.0):
+        self.path = Path(db_path or DB_PATH)
+        self.max_readers = max_readers
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._write_lock = threading.RLock()
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._readers: List[sqlite3.Connection] = []
+        self._writer: Optional[sqlite3.Connection] = None
+
+    def _connect_reader(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=self.timeout, check_same_thread=False)
+        conn.execute("PRAGMA query_only=ON;")
+        apply_pragmas(conn, "serve")
+        return conn
+
+    def _get_writer(self) -> sqlite3.Connection:
+        with self._lock:
+            if self._writer is None:
+                # first connection in the process: WAL + schema, exactly once
+                conn = get_conn(self.path, profile="serve", timeout=self.timeout, check_same_thread=False)
+                init_db(conn)
+                self._writer = conn
+            return self._writer
+
+    @contextmanager
+    def writer(self) -> Iterator[sqlite3.Connection]:
+        conn = self._get_writer()
+        with self._write_lock:
+            try:
+                yield conn
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+
+    @contextmanager
+    def reader(self) -> Iterator[sqlite3.Connection]:
+        self._get_writer()  # schema must exist before the first read
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                conn = self._connect_reader() if len(self._readers) < self.max_readers else None
+                if conn is not None:
+                    self._readers.append(conn)
+            if conn is None:
+                conn = self._idle.get(timeout=self.timeout)
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            self._idle.put(conn)
+
+    def close(self) -> None:
+        with self._lock:
+            for conn in self._readers:
+                conn.close()
+            self._readers.clear()
+            self._idle = queue.LifoQueue()
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
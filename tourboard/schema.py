@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+import pandas as pd
+import pyarrow as pa
+
+# One definition of what an event row is, on disk and in memory.
+
+# -- on disk (Parquet store / Arrow hot file) ---------------------------------
+
+EVENT_SCHEMA = pa.schema([
+    ("region", pa.string()),
+    ("date_range", pa.string()),
+    ("start_date", pa.date32()),
+    ("end_date", pa.date32()),
+    ("artist", pa.string()),
+    ("venue", pa.string()),
+    ("city", pa.string()),
+    ("country", pa.string()),
+    ("gross_usd", pa.float64()),
+    ("tickets", pa.int64()),
+    ("capacity_pct", pa.float64()),
+    ("shows", pa.int64()),
+    # attached by the updater's geocoding stage, not part of the scraped row
+    ("lat", pa.float64()),
+    ("lon", pa.float64()),
+    ("source_url", pa.string()),
+    ("scraped_at", pa.string()),
+    ("event_key", pa.string()),
+    ("content_hash", pa.string()),
+])
+
+SNAPSHOT_SCHEMA = pa.schema([
+    ("scraped_at", pa.string()),
+    ("source_url", pa.string()),
+    ("reported_revenue_usd", pa.float64()),
+    ("reported_tickets", pa.int64()),
+    ("avg_revenue_usd", pa.float64()),
+    ("avg_tickets", pa.int64()),
+    ("avg_price_usd", pa.float64()),
+    ("total_reports_text", pa.string()),
+])
+
+# -- in memory (what loaders hand to the app) ---------------------------------
+
+# Low-cardinality labels repeated on every row of a tour.
+CATEGORY_COLUMNS = ("region", "country", "city", "venue", "artist")
+
+DATE_COLUMNS = ("start_date", "end_date")
+
+EVENT_DTYPES = {
+    # float32 has a 24-bit mantissa: a $30M gross would be off by whole
+    # dollars, so money stays float64. A percentage is fine in float32.
+    "gross_usd": "float64",
+    "capacity_pct": "float32",
+    # nullable: unreported stops have no ticket count
+    "tickets": "Int32",
+    "shows": "Int16",
+    "lat": "float64",
+    "lon": "float64",
+}
+
+
+def apply_event_schema(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Typed, compact copy of an events frame from any source (CSV, Parquet,
+    Arrow, SQLite). Columns that are not there are skipped; unparseable
+    values become missing.
+    """
+    out = df.copy()
+    for col, dtype in EVENT_DTYPES.items():
+        if col in out.columns:
+            out[col] = pd.to_numeric(out[col], errors="coerce").astype(dtype)
+    for col in CATEGORY_COLUMNS:
+        if col in out.columns:
+            out[col] = out[col].astype("category")
+    for col in DATE_COLUMNS:
+        if col in out.columns:
+            out[col] = pd.to_datetime(out[col], errors="coerce")
+    return out
@@ -1,13 +1,23 @@
 from __future__ import annotations
 
+import logging
+import os
 import re
 from dataclasses import dataclass
 from datetime import datetime, timezone
-from typing import Optional, Tuple, List, Dict
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 
+import lxml.html
 import requests
 from bs4 import BeautifulSoup
 
+from tourboard.changes import annotate
+from tourboard.dates import iso_date_range
+from tourboard.fetch import PageCache, USER_AGENT, fetch_page
+from tourboard.transport import default_session
+
+log = logging.getLogger(__name__)
+
 SOURCE_URL = "https://touringdata.org/2025/06/19/bad-bunny-debi-tirar-mas-fotos-tour/"
 
 
@@ -23,15 +33,32 @@ class Snapshot:
     source_url: str
 
 
+_MONEY_RE = re.compile(r"\$([\d,]+(?:\.\d+)?)")
+_INT_RE = re.compile(r"([\d,]+)")
+_CAPACITY_RE = re.compile(r"\((\d+(?:\.\d+)?)%\)")
+
+
 def _now_iso() -> str:
     return datetime.now(timezone.utc).replace(microsecond=0).isoformat()
 
 
-def fetch_html(url: str = SOURCE_URL, timeout: int = 25) -> str:
-    headers = {
-        "User-Agent": "DTMF-Tourboard/1.0 (personal project; contact: you@example.com)"
-    }
-    r = requests.get(url, headers=headers, timeout=timeout)
+def fetch_html(
+    url: str = SOURCE_URL,
+    timeout: int = 25,
+    cache: Optional[PageCache] = None,
+    session: Optional[requests.Session] = None,
+) -> str:
+    """
+    With a cache, the request is conditional (ETag / Last-Modified) and the
+    body is served from disk on 304. Pass a session to reuse connections.
+    """
+    if cache is not None:
+        res = fetch_page(url, cache, timeout=timeout, session=session)
+        cache.save()
+        return res.html
+
+    headers = {"User-Agent": USER_AGENT}
+    r = (session or default_session()).get(url, headers=headers, timeout=timeout)
     r.raise_for_status()
     return r.text
 
@@ -42,7 +69,7 @@ def _to_float_money(s: str) -> Optional[float]:
     s = s.strip()
     if s.upper() == "TBA":
         return None
-    m = re.search(r"\$([\d,]+(?:\.\d+)?)", s)
+    m = _MONEY_RE.search(s)
     if not m:
         return None
     return float(m.group(1).replace(",", ""))
@@ -54,14 +81,14 @@ def _to_int(s: str) -> Optional[int]:
     s = s.strip()
     if s.upper() == "TBA":
         return None
-    m = re.search(r"([\d,]+)", s)
+    m = _INT_RE.search(s)
     if not m:
         return None
     return int(m.group(1).replace(",", ""))
 
 
 def _parse_capacity_pct(s: str) -> Optional[float]:
-    m = re.search(r"\((\d+(?:\.\d+)?)%\)", s)
+    m = _CAPACITY_RE.search(s)
     if not m:
         return None
     return float(m.group(1))
@@ -77,217 +104,266 @@ def _split_location_and_gross(s: str) -> Tuple[str, Optional[float]]:
     return s.replace(" TBA", "").strip(), None
 
 
-def parse_snapshot_and_lines(html: str) -> Tuple[Snapshot, List[str]]:
+# Text extraction engines: "bs4" flattens the soup with get_text and splits
+# it; "lxml" walks the element tree and yields the text nodes directly,
+# without building a BeautifulSoup tree or one giant string. Both produce the
+# same stripped, non-empty lines.
+PARSER_ENGINES = ("bs4", "lxml")
+DEFAULT_ENGINE = os.environ.get("TOURBOARD_PARSER", "bs4")
+
+SNAPSHOT_LABELS = (
+    "Reported Revenue",
+    "Reported Tickets Sold",
+    "Average Revenue",
+    "Average Tickets Sold",
+    "Average Price",
+    "Total Reports",
+)
+
+# get_text() leaves out the strings inside these (and comments)
+_LXML_SKIP_TAGS = frozenset({"script", "style", "template"})
+
+
+def _lines_bs4(html: str) -> List[str]:
     soup = BeautifulSoup(html, "lxml")
     text = soup.get_text("\n")
     lines = [ln.strip() for ln in text.splitlines()]
-    lines = [ln for ln in lines if ln]
+    return [ln for ln in lines if ln]
 
-    def find_value_after(label: str) -> Optional[str]:
-        for i, ln in enumerate(lines):
-            if ln == label and i + 1 < len(lines):
-                return lines[i + 1]
-        return None
 
-    reported_revenue = _to_float_money(find_value_after("Reported Revenue") or "")
-    reported_tickets = _to_int(find_value_after("Reported Tickets Sold") or "")
-    avg_revenue = _to_float_money(find_value_after("Average Revenue") or "")
-    avg_tickets = _to_int(find_value_after("Average Tickets Sold") or "")
-    avg_price = _to_float_money(find_value_after("Average Price") or "")
-    total_reports_text = find_value_after("Total Reports")
-
-    snap = Snapshot(
-        scraped_at=_now_iso(),
-        reported_revenue_usd=reported_revenue,
-        reported_tickets=reported_tickets,
-        avg_revenue_usd=avg_revenue,
-        avg_tickets=avg_tickets,
-        avg_price_usd=avg_price,
-        total_reports_text=total_reports_text,
-        source_url=SOURCE_URL,
+def _lines_lxml(html: str) -> List[str]:
+    root = lxml.html.document_fromstring(html)
+    lines: List[str] = []
+    skip_until = None  # element whose subtree we are skipping
+    for el in root.iter():
+        if skip_until is not None:
+            if el is skip_until or _is_descendant(el, skip_until):
+                continue
+            skip_until = None
+        # comments / PIs have a non-str tag: drop their text, keep their tail
+        if isinstance(el.tag, str):
+            if el.tag in _LXML_SKIP_TAGS:
+                skip_until = el
+            elif el.text:
+                lines.extend(el.text.splitlines())
+        if el.tail:
+            lines.extend(el.tail.splitlines())
+    lines = [ln.strip() for ln in lines]
+    return [ln for ln in lines if ln]
+
+
+def _is_descendant(el, ancestor) -> bool:
+    p = el.getparent()
+    while p is not None:
+        if p is ancestor:
+            return True
+        p = p.getparent()
+    return False
+
+
+def _label_index(lines: List[str]) -> Dict[str, str]:
+    """{label: line after its first occurrence} for the snapshot labels, in one pass."""
+    wanted = set(SNAPSHOT_LABELS)
+    found: Dict[str, str] = {}
+    for i in range(len(lines) - 1):
+        ln = lines[i]
+        if ln in wanted and ln not in found:
+            found[ln] = lines[i + 1]
+            if len(found) == len(wanted):
+                break
+    return found
+
+
+def extract_lines(html: str, engine: Optional[str] = None) -> List[str]:
+    engine = engine or DEFAULT_ENGINE
+    if engine == "bs4":
+        return _lines_bs4(html)
+    if engine == "lxml":
+        return _lines_lxml(html)
+    raise ValueError(f"Unknown parser engine {engine!r} (expected one of {PARSER_ENGINES})")
+
+
+def parse_snapshot(lines: List[str], source_url: str = SOURCE_URL, scraped_at: Optional[str] = None) -> Snapshot:
+    values = _label_index(lines)
+    return Snapshot(
+        scraped_at=scraped_at or _now_iso(),
+        reported_revenue_usd=_to_float_money(values.get("Reported Revenue", "")),
+        reported_tickets=_to_int(values.get("Reported Tickets Sold", "")),
+        avg_revenue_usd=_to_float_money(values.get("Average Revenue", "")),
+        avg_tickets=_to_int(values.get("Average Tickets Sold", "")),
+        avg_price_usd=_to_float_money(values.get("Average Price", "")),
+        total_reports_text=values.get("Total Reports"),
+        source_url=source_url,
     )
-    return snap, lines
 
 
-def parse_events(lines: List[str], scraped_at: str, source_url: str) -> List[Dict]:
-    """
-    Robust parser for Touring Data pages.
-
-    Key fix:
-    - Handles region headers appearing as TWO LINES:
-        "Latin America"
-        "Box Office"
-      (as seen in your debug output)
-    - Also still supports "Latin America Box Office" on one line.
-    """
+def parse_snapshot_and_lines(
+    html: str, source_url: str = SOURCE_URL, engine: Optional[str] = None
+) -> Tuple[Snapshot, List[str]]:
+    lines = extract_lines(html, engine)
+    return parse_snapshot(lines, source_url), lines
 
-    def norm(s: str) -> str:
-        s = s.replace("\u00a0", " ").replace("\u2009", " ").strip()
-        s = re.sub(r"\s+", " ", s)
-        return s
 
-    L = [norm(x) for x in lines if norm(x)]
-    events: List[Dict] = []
+# --- Event block parsing ---
+#
+# Each normalised line is classified once into bit flags. A backward pass then
+# records, for every position, the next line of each kind, so resolving an
+# event block (first gross / location / tickets line before the "N shows"
+# line) is a constant-time lookup instead of a rescan of the block.
 
-    region_names = ["Latin America", "Europe", "Oceania"]
-    current_region: Optional[str] = None
+REGION_NAMES = ("Latin America", "Europe", "Oceania")
 
-    # Date lines like "November 21-22, 2025"
-    def is_date_line(s: str) -> bool:
-        return bool(re.search(r",\s*\d{4}\s*$", s)) and any(
-            s.lower().startswith(m) for m in
-            ["jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"]
-        )
+_MONTH_PREFIXES = ("jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec")
 
-    def looks_like_tickets(s: str) -> bool:
-        # IMPORTANT: tickets lines do NOT contain '$' — exclude gross lines
+_YEAR_END_RE = re.compile(r",\s*\d{4}\s*$")          # "November 21-22, 2025"
+_SHOWS_RE = re.compile(r"\b\d+\s*show", re.IGNORECASE)  # "2 shows", "1 show"
+_THOUSANDS_RE = re.compile(r"\b\d{1,3}(?:,\d{3})+\b")  # "64,175"
 
-        if "$" in s:
-            return False
-        if s.strip().upper() == "TBA":
-            return True
-        if "(" in s and "%" in s:
-            return True
-        return bool(re.search(r"\b\d{1,3}(?:,\d{3})+\b", s))
+_DATE = 1 << 0
+_SHOWS = 1 << 1
+_GROSS = 1 << 2      # contains "$"
+_LOCATION = 1 << 3   # "City, Country"
+_PCT = 1 << 4        # tickets with capacity, e.g. "64,175 (100%)"
+_TBA = 1 << 5
+_NUMERIC = 1 << 6    # any other thousands-separated number without "$"
 
-    def looks_like_shows(s: str) -> bool:
-    # Examples: "2 shows", "8 shows", "1 show"
-        return bool(re.search(r"\b\d+\s*show", s, re.IGNORECASE))
+_BLOCK_KINDS = (_SHOWS, _GROSS, _LOCATION, _PCT, _TBA, _NUMERIC)
 
+# an event block must reach its "N shows" line within this many lines of the date
+_BLOCK_WINDOW = 40
 
 
-    def looks_like_location(s: str) -> bool:
-        if "$" in s:
-            return False
-        if "box office" in s.lower():
-            return False
-        if "reported" in s.lower():
-            return False
-        return ("," in s) and (len(s) <= 80)
+def _norm(s: str) -> str:
+    # str.split() splits on the same Unicode whitespace as \s (incl. NBSP / thin space)
+    return " ".join(s.split())
 
-    def looks_like_tickets(s: str) -> bool:
-        if s.strip().upper() == "TBA":
-            return True
+
+def _classify(s: str) -> int:
+    low = s.lower()
+    f = 0
+    if "$" in s:
+        # tickets and location lines never contain '$'
+        f |= _GROSS
+    else:
+        if s.upper() == "TBA":
+            f |= _TBA
         if "(" in s and "%" in s:
-            return True
-        return bool(re.search(r"\b\d{1,3}(?:,\d{3})+\b", s))
+            f |= _PCT
+        if _THOUSANDS_RE.search(s):
+            f |= _NUMERIC
+        if "," in s and len(s) <= 80 and "box office" not in low and "reported" not in low:
+            f |= _LOCATION
+    if _SHOWS_RE.search(s):
+        f |= _SHOWS
+    if low.startswith(_MONTH_PREFIXES) and _YEAR_END_RE.search(s):
+        f |= _DATE
+    return f
+
+
+def iter_events(lines: Iterable[str], scraped_at: str, source_url: str) -> Iterator[Dict]:
+    """
+    Parser for Touring Data pages, yielding one dict per event run.
+
+    Region headers appear either as one line ("Latin America Box Office") or
+    as two ("Latin America" then "Box Office"). Inside a region, an event
+    starts at a date line, followed by artist and venue, and ends at the
+    first "N shows" line within the block window. Tickets prefer the
+    "64,175 (100%)" form, then "TBA", then any other number that is not
+    the gross.
 
+    Each event also carries event_key (date_range|venue|city) and a
+    content_hash of its data fields; see tourboard.changes.
+    """
+    L = [ln for ln in map(_norm, lines) if ln]
+    n = len(L)
+    flags = [_classify(ln) for ln in L]
+
+    # nxt[kind][i] = first index >= i with that kind (n if none)
+    nxt = {}
+    for kind in _BLOCK_KINDS:
+        arr = [n] * (n + 1)
+        k = n
+        for i in range(n - 1, -1, -1):
+            if flags[i] & kind:
+                k = i
+            arr[i] = k
+        nxt[kind] = arr
+
+    current_region: Optional[str] = None
     i = 0
-    while i < len(L):
+    while i < n:
         ln = L[i]
 
-        # ✅ Region header can be:
-        # 1) "Latin America Box Office" in one line
-        # 2) "Latin America" followed by "Box Office" in the next line (your case)
-        # Case 1:
-        for r in region_names:
-            if ln.lower().startswith(r.lower()) and "box office" in ln.lower():
-                current_region = r
-                break
+        low = ln.lower()
+        if "box office" in low:
+            for r in REGION_NAMES:
+                if low.startswith(r.lower()):
+                    current_region = r
+                    break
 
-        # Case 2:
-        if ln in region_names and (i + 1) < len(L) and L[i + 1].lower() == "box office":
+        if ln in REGION_NAMES and i + 1 < n and L[i + 1].lower() == "box office":
             current_region = ln
             i += 2
             continue
 
-        # Parse event blocks once we are inside a region
-        if current_region and is_date_line(ln):
-            date_range = ln
-            artist = L[i + 1] if i + 1 < len(L) else ""
-            venue = L[i + 2] if i + 2 < len(L) else ""
-
-            # Scan forward to find the "X shows" line (up to 40 lines)
-            block = []
-            j = i + 3
-            while j < len(L) and j < i + 40:
-                block.append(L[j])
-                if looks_like_shows(L[j]):
-                    break
-                j += 1
-
-            shows_line = next((x for x in block if looks_like_shows(x)), None)
-            if not shows_line:
-                i += 1
-                continue
-
-            shows = _to_int(shows_line)
-
-            gross_line = next((x for x in block if "$" in x), None)
-            gross_usd = _to_float_money(gross_line or "")
-
-            location_line = next((x for x in block if looks_like_location(x)), None)
-            location = (location_line or "").replace(" TBA", "").strip()
-
-            city, country = None, None
-            if "," in location:
-                city, country = [p.strip() for p in location.split(",", 1)]
-            elif location:
-                city = location
-
-            # --- Tickets line selection (prefer lines with % like "64,175 (100%)") ---
-            tickets_line = None
-            # 1) Prefer the percentage format (most reliable for tickets)
-            tickets_line = next((x for x in block if ("%" in x and "(" in x) and "$" not in x), None)
-
-            # 2) If not found, allow "TBA" (still not gross)
-            if tickets_line is None:
-                tickets_line = next((x for x in block if x.strip().upper() == "TBA" and "$" not in x), None)
-                
-            # 3) Fallback: pick a numeric line that is NOT the gross line
-            if tickets_line is None:
-                gross_line = next((x for x in block if "$" in x), None)
-                numeric_candidates = [
-                    x for x in block
-                    if ("$" not in x)
-                    and bool(re.search(r"\b\d{1,3}(?:,\d{3})+\b", x))
-                    and (x != gross_line)
-                ]
-                tickets_line = numeric_candidates[0] if numeric_candidates else None
-            
-    
-            tickets = _to_int(tickets_line or "")
-            capacity_pct = _parse_capacity_pct(tickets_line or "")
-
-
-            events.append(
-                {
-                    "region": current_region,
-                    "date_range": date_range,
-                    "start_date": None,
-                    "end_date": None,
-                    "artist": artist,
-                    "venue": venue,
-                    "city": city,
-                    "country": country,
-                    "gross_usd": gross_usd,
-                    "tickets": tickets,
-                    "capacity_pct": capacity_pct,
-                    "shows": shows,
-                    "source_url": source_url,
-                    "scraped_at": scraped_at,
-                }
-            )
-
-            i = j + 1
+        if not (current_region and flags[i] & _DATE):
+            i += 1
             continue
 
-        i += 1
-
-    return events
+        start = min(i + 3, n)
+        j = nxt[_SHOWS][start]
+        if j >= min(n, i + _BLOCK_WINDOW):
+            i += 1
+            continue
 
+        def first(kind: int) -> Optional[str]:
+            k = nxt[kind][start]
+            return L[k] if k <= j else None
+
+        location = (first(_LOCATION) or "").replace(" TBA", "").strip()
+        city, country = None, None
+        if "," in location:
+            city, country = [p.strip() for p in location.split(",", 1)]
+        elif location:
+            city = location
+
+        tickets_line = first(_PCT) or first(_TBA) or first(_NUMERIC) or ""
+        start_date, end_date = iso_date_range(ln)
+
+        yield annotate({
+            "region": current_region,
+            "date_range": ln,
+            "start_date": start_date,
+            "end_date": end_date,
+            "artist": L[i + 1] if i + 1 < n else "",
+            "venue": L[i + 2] if i + 2 < n else "",
+            "city": city,
+            "country": country,
+            "gross_usd": _to_float_money(first(_GROSS) or ""),
+            "tickets": _to_int(tickets_line),
+            "capacity_pct": _parse_capacity_pct(tickets_line),
+            "shows": _to_int(L[j]),
+            "source_url": source_url,
+            "scraped_at": scraped_at,
+        })
+        i = j + 1
 
 
+def parse_events(lines: List[str], scraped_at: str, source_url: str) -> List[Dict]:
+    return list(iter_events(lines, scraped_at, source_url))
 
 
 def scrape_all(url: str = SOURCE_URL) -> Tuple[Snapshot, List[Dict]]:
     html = fetch_html(url)
-    snap, lines = parse_snapshot_and_lines(html)
-    events = parse_events(lines, scraped_at=snap.scraped_at, source_url=url)
-    print("DEBUG parsed events:", len(events))
-    if len(events) == 0:
-        print("DEBUG sample lines:")
-        for k, ln in enumerate(lines[:120]):
-            print(k, repr(ln))
+    return scrape_html(html, url)
 
+
+def scrape_html(html: str, url: str = SOURCE_URL, engine: Optional[str] = None) -> Tuple[Snapshot, List[Dict]]:
+    snap, lines = parse_snapshot_and_lines(html, source_url=url, engine=engine)
+    events = parse_events(lines, scraped_at=snap.scraped_at, source_url=url)
+    log.debug("parsed %d events from %s", len(events), url)
+    if not events:
+        log.warning("no events parsed from %s (%d text lines)", url, len(lines))
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("first text lines of %s:\n%s", url, "\n".join(f"{k} {ln!r}" for k, ln in enumerate(lines[:120])))
     return snap, events
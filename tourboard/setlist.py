@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+import re
+from typing import Dict, List, Optional
+
+import pandas as pd
+from bs4 import BeautifulSoup
+
+INT_RE = re.compile(r"(\d+)")
+_SONG_SUFFIX_RE = re.compile(r"\s*\([^)]*song\)\s*$", re.IGNORECASE)
+_MULTI_WS_RE = re.compile(r"\s{2,}")
+
+
+def clean_song(s: str) -> str:
+    s = (s or "").strip()
+    s = _SONG_SUFFIX_RE.sub("", s).strip()
+    s = _MULTI_WS_RE.sub(" ", s).strip()
+    return s
+
+
+def extract_int(text: str) -> Optional[int]:
+    # Take the first integer found (works if cell contains "25 0", "25\n0", etc.)
+    m = INT_RE.search(text or "")
+    return int(m.group(1)) if m else None
+
+
+def find_songs_table(soup: BeautifulSoup):
+    """The setlist.fm stats table, found by its Song / Performances headers."""
+    for t in soup.find_all("table"):
+        headers = [th.get_text(" ", strip=True).lower() for th in t.find_all("th")]
+        if any("song" == h for h in headers) and any("perform" in h for h in headers):
+            return t
+        if any("song" in h for h in headers) and any("perform" in h for h in headers):
+            return t
+    return None
+
+
+def parse_songs_table(table) -> List[Dict]:
+    data = []
+    rows = table.find_all("tr")
+    for tr in rows[1:]:  # skip header
+        tds = tr.find_all("td")
+        if len(tds) < 3:
+            continue
+
+        # Layout: rank | song | performances
+        song_text = tds[1].get_text(" ", strip=True)
+        plays_text = tds[-1].get_text(" ", strip=True)
+
+        song = clean_song(song_text)
+        plays = extract_int(plays_text)
+
+        if song and plays is not None:
+            data.append({"song": song, "plays": plays})
+    return data
+
+
+def songs_frame(data: List[Dict]) -> pd.DataFrame:
+    return (
+        pd.DataFrame(data)
+        .drop_duplicates(subset=["song"], keep="first")
+        .sort_values(["plays", "song"], ascending=[False, True])
+        .reset_index(drop=True)
+    )
+
+
+def parse_songs(html: str) -> pd.DataFrame:
+    soup = BeautifulSoup(html, "lxml")
+    table = find_songs_table(soup)
+    if table is None:
+        raise RuntimeError("Could not find Song/Performances table on the page.")
+
+    data = parse_songs_table(table)
+    if not data:
+        raise RuntimeError("Parsed 0 songs from table rows. Page structure may have changed.")
+    return songs_frame(data)
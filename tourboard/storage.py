@@ -0,0 +1,256 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import re
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence
+from urllib.parse import urlsplit
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.feather as feather
+import pyarrow.parquet as pq
+
+from tourboard.schema import EVENT_SCHEMA, SNAPSHOT_SCHEMA, apply_event_schema
+
+STORE_DIR = Path("data") / "store"
+HOT_EVENTS = Path("data") / "events_latest.arrow"
+EVENTS_CSV = Path("data") / "events_latest.csv"
+
+# Layout (hive-style, so pyarrow.dataset can scan it with partition pruning):
+#
+#   events/tour=<slug>/scrape_date=<YYYY-MM-DD>/<scraped_at>.parquet
+#   snapshots/tour=<slug>/scrape_date=<YYYY-MM-DD>/<scraped_at>.parquet
+#
+# Every write is a new small file, nothing is ever rewritten: an events file
+# holds a tour's full list of stops as of that scrape (written only when it
+# changed), a snapshots file the one header row of that scrape. The newest
+# events file per tour is the tour's current state. <slug> is tour_slug():
+# one partition per source URL.
+
+# nullable ints stay ints (tickets is missing for unreported stops)
+_PANDAS_TYPES = {pa.int64(): pd.Int64Dtype()}.get
+
+_PARTITION_SCHEMA = pa.schema([("tour", pa.string()), ("scrape_date", pa.string())])
+
+_SLUG_RE = re.compile(r"[^a-z0-9]+")
+
+
+def to_frame(table: pa.Table) -> pd.DataFrame:
+    return table.to_pandas(types_mapper=_PANDAS_TYPES)
+
+
+def tour_slug(url: str) -> str:
+    """
+    Partition name for a tour page: its last path segment plus a short hash
+    of the full URL, e.g. "bad-bunny-debi-tirar-mas-fotos-tour-1a2b3c4d".
+    The segment keeps it readable; the hash keeps two pages that end the
+    same way (another host, a generic "index.html") in separate partitions.
+    """
+    parts = urlsplit(url or "")
+    segment = next((p for p in reversed(parts.path.split("/")) if p), "") or parts.netloc or "unknown"
+    slug = _SLUG_RE.sub("-", segment.lower()).strip("-") or "unknown"
+    return f"{slug}-{hashlib.sha1((url or '').encode('utf-8')).hexdigest()[:8]}"
+
+
+def _file_stem(scraped_at: str) -> str:
+    # "2026-08-17T14:45:33+00:00" -> "20260817T1445330000": path-safe and
+    # still sorts in time order (scraped_at is always UTC)
+    return re.sub(r"[^0-9A-Za-z]", "", scraped_at or "") or "unknown"
+
+
+def _to_table(df: pd.DataFrame, schema: pa.Schema) -> pa.Table:
+    df = df.reindex(columns=schema.names)
+    for f in schema:
+        col = df[f.name]
+        if pa.types.is_integer(f.type):
+            df[f.name] = pd.to_numeric(col, errors="coerce").astype("Int64")
+        elif pa.types.is_floating(f.type):
+            df[f.name] = pd.to_numeric(col, errors="coerce").astype("float64")
+        elif pa.types.is_date(f.type):
+            df[f.name] = pd.to_datetime(col, errors="coerce").dt.date
+        else:
+            df[f.name] = col.astype(object).where(col.notna(), None)
+    return pa.Table.from_pandas(df, schema=schema, preserve_index=False)
+
+
+class ParquetStore:
+    """Append-only, partitioned Parquet files for events and snapshots."""
+
+    def __init__(self, root: Path = STORE_DIR, compression: str = "zstd"):
+        self.root = Path(root)
+        self.compression = compression
+
+    def _path(self, kind: str, source_url: str, scraped_at: str) -> Path:
+        scrape_date = (scraped_at or "")[:10] or "unknown"
+        return self.root / kind / f"tour={tour_slug(source_url)}" / f"scrape_date={scrape_date}" / f"{_file_stem(scraped_at)}.parquet"
+
+    def _write(self, path: Path, table: pa.Table) -> Path:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        pq.write_table(table, tmp, compression=self.compression)
+        os.replace(tmp, path)
+        return path
+
+    def _files(self, kind: str) -> List[Path]:
+        base = self.root / kind
+        return sorted(base.glob("tour=*/scrape_date=*/*.parquet")) if base.exists() else []
+
+    # -- writes ---------------------------------------------------------
+
+    def write_events(self, source_url: str, scraped_at: str, events: Iterable[Dict]) -> Path:
+        """One tour's full list of stops as of one scrape."""
+        df = pd.DataFrame(list(events)).assign(source_url=source_url, scraped_at=scraped_at)
+        return self._write(self._path("events", source_url, scraped_at), _to_table(df, EVENT_SCHEMA))
+
+    def append_snapshots(self, snaps: Iterable[Dict]) -> List[Path]:
+        """One file per snapshot row; cost is independent of how much history exists."""
+        return [
+            self._write(self._path("snapshots", s.get("source_url"), s.get("scraped_at")),
+                        _to_table(pd.DataFrame([s]), SNAPSHOT_SCHEMA))
+            for s in snaps
+        ]
+
+    # -- reads ----------------------------------------------------------
+
+    def has_events(self) -> bool:
+        return bool(self._files("events"))
+
+    def has_snapshots(self) -> bool:
+        return bool(self._files("snapshots"))
+
+    def latest_event_files(self, source_urls: Optional[Iterable[str]] = None) -> List[Path]:
+        wanted = {f"tour={tour_slug(u)}" for u in source_urls} if source_urls is not None else None
+        latest: Dict[str, Path] = {}
+        for path in self._files("events"):
+            tour = path.parent.parent.name
+            if wanted is None or tour in wanted:
+                # sorted() walks scrape_date then file stem, so the last one wins
+                latest[tour] = path
+        return list(latest.values())
+
+    def latest_events_table(
+        self, columns: Optional[Sequence[str]] = None, source_urls: Optional[Iterable[str]] = None
+    ) -> pa.Table:
+        files = self.latest_event_files(source_urls)
+        cols = list(columns) if columns is not None else EVENT_SCHEMA.names
+        if not files:
+            return pa.schema([EVENT_SCHEMA.field(c) for c in cols]).empty_table()
+        return pa.concat_tables([pq.read_table(f, columns=cols, schema=EVENT_SCHEMA) for f in files])
+
+    def read_latest_events(
+        self, columns: Optional[Sequence[str]] = None, source_urls: Optional[Iterable[str]] = None
+    ) -> pd.DataFrame:
+        """Current stops of every tour (or the given ones), reading only `columns`."""
+        return to_frame(self.latest_events_table(columns, source_urls))
+
+    def scan(self, kind: str, columns: Optional[Sequence[str]] = None, filter=None) -> pd.DataFrame:
+        """
+        Full history of `kind` ("events" / "snapshots") as one frame. `tour`
+        and `scrape_date` are available as partition columns, e.g.
+        filter=ds.field("scrape_date") >= "2026-01-01".
+        """
+        schema = pa.unify_schemas([EVENT_SCHEMA if kind == "events" else SNAPSHOT_SCHEMA, _PARTITION_SCHEMA])
+        files = self._files(kind)
+        if not files:
+            return pd.DataFrame(columns=list(columns) if columns is not None else schema.names)
+        dataset = ds.dataset(
+            [str(f) for f in files],
+            schema=schema,
+            format="parquet",
+            partitioning=ds.partitioning(_PARTITION_SCHEMA, flavor="hive"),
+            partition_base_dir=str(self.root / kind),
+        )
+        return to_frame(dataset.to_table(columns=list(columns) if columns is not None else None, filter=filter))
+
+    def read_snapshots(self, columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+        df = self.scan("snapshots", columns=columns)
+        return df.sort_values("scraped_at", kind="stable", ignore_index=True) if "scraped_at" in df.columns else df
+
+
+# The "hot" file: current stops of every tour as one uncompressed Arrow IPC
+# (Feather v2) file, so a reader gets the typed columns it asks for with
+# nothing to decompress or parse, and only those columns' buffers are
+# read. It is read into memory, not mapped: to_pandas and
+# apply_event_schema copy the columns anyway, and the app keeps the result
+# per data version (st.cache_data), so the file is read once per publish
+# rather than on every rerun. Republished atomically by the updater.
+
+
+def publish_hot(table: pa.Table, path: Path = HOT_EVENTS) -> Path:
+    """Write `table` as the hot file (uncompressed Arrow IPC), replacing it atomically."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(f".{os.getpid()}.tmp")
+    with pa.OSFile(str(tmp), "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp, path)
+    return path
+
+
+def hot_schema(path: Path = HOT_EVENTS) -> pa.Schema:
+    """Schema of the hot file, from its footer (no column data is read)."""
+    with pa.OSFile(str(path), "rb") as source:
+        return pa.ipc.open_file(source).schema
+
+
+def open_hot(path: Path = HOT_EVENTS, columns: Optional[Sequence[str]] = None) -> pa.Table:
+    """The hot file as a table, reading only `columns` (those it has) when given."""
+    if columns is not None:
+        names = hot_schema(path).names
+        columns = [c for c in columns if c in names]
+    return feather.read_table(str(path), columns=columns, memory_map=False)
+
+
+def read_hot(columns: Optional[Sequence[str]] = None, path: Path = HOT_EVENTS) -> pd.DataFrame:
+    return to_frame(open_hot(path, columns))
+
+
+def publish_events(df: pd.DataFrame, hot_path: Path = HOT_EVENTS, csv_path: Path = EVENTS_CSV) -> None:
+    """Current stops of every tour: the hot file for the app and the flat CSV export."""
+    table = _to_table(df, EVENT_SCHEMA)
+    publish_hot(table, hot_path)
+    to_frame(table).to_csv(csv_path, index=False)
+
+
+def data_version(store: Optional[ParquetStore] = None, csv_path: Path = EVENTS_CSV) -> Optional[str]:
+    """
+    Token for the data load_events would return: path, size and mtime of
+    the file it reads (the newest store file for the store). Every publish
+    replaces the hot file / CSV atomically, so the token changes exactly
+    when the updater publishes; key caches on it. None if there is no data.
+    """
+    store = store or ParquetStore()
+    if HOT_EVENTS.exists():
+        paths = [HOT_EVENTS]
+    elif store.has_events():
+        paths = store.latest_event_files()
+    elif csv_path.exists():
+        paths = [csv_path]
+    else:
+        return None
+    return ";".join(f"{p}:{p.stat().st_size}:{p.stat().st_mtime_ns}" for p in paths)
+
+
+def load_events(
+    columns: Optional[Sequence[str]] = None, store: Optional[ParquetStore] = None, csv_path: Path = EVENTS_CSV
+) -> Optional[pd.DataFrame]:
+    """
+    Current stops for display, typed per tourboard.schema: from the hot
+    file, else the Parquet store, else the CSV export. None if there is no
+    data yet.
+    """
+    store = store or ParquetStore()
+    if HOT_EVENTS.exists():
+        df = read_hot(columns)
+    elif store.has_events():
+        df = store.read_latest_events(columns)
+    elif csv_path.exists():
+        df = pd.read_csv(csv_path, usecols=(lambda c: c in columns) if columns is not None else None)
+    else:
+        return None
+    return apply_event_schema(df)
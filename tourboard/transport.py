@@ -0,0 +1,252 @@
+from __future__ import annotations
+
+import base64
+import gzip
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import timedelta
+from pathlib import Path
+from typing import Optional
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from urllib3.util.retry import Retry
+
+# Every HTTP call in the project goes through a session returned by
+# new_session() / default_session() (or wrap() for sessions built elsewhere,
+# e.g. geopy's). The mode decides what that session does:
+#
+#   live    plain requests.Session
+#   record  live, and every response is also written to the cassette dir
+#   replay  responses come from the cassette dir only; no network at all
+#
+# Configured from the environment (or configure() in code):
+#   TOURBOARD_TRANSPORT          live | record | replay
+#   TOURBOARD_CASSETTES          cassette directory (default bench/cassettes)
+#   TOURBOARD_REPLAY_LATENCY     seconds added per replayed request, or "recorded"
+#   TOURBOARD_REPLAY_ERROR_RATE  probability of an injected failure (0..1)
+#   TOURBOARD_REPLAY_ERROR_KIND  connection | timeout | http (503 response)
+#   TOURBOARD_REPLAY_SEED        seed for the error injection RNG
+
+MODES = ("live", "record", "replay")
+ERROR_KINDS = ("connection", "timeout", "http")
+
+CASSETTE_DIR = Path("bench") / "cassettes"
+
+
+class CassetteMiss(requests.ConnectionError):
+    """Replay mode was asked for a URL that was never recorded."""
+
+
+@dataclass
+class TransportConfig:
+    mode: str = "live"
+    cassette_dir: Path = CASSETTE_DIR
+    latency: float = 0.0
+    recorded_latency: bool = False
+    error_rate: float = 0.0
+    error_kind: str = "connection"
+    seed: Optional[int] = None
+    _rng: random.Random = field(default=None, init=False, repr=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False, repr=False)
+
+    def __post_init__(self):
+        if self.mode not in MODES:
+            raise ValueError(f"Unknown transport mode {self.mode!r} (expected one of {MODES})")
+        if self.error_kind not in ERROR_KINDS:
+            raise ValueError(f"Unknown error kind {self.error_kind!r} (expected one of {ERROR_KINDS})")
+        self.cassette_dir = Path(self.cassette_dir)
+        self._rng = random.Random(self.seed)
+
+    def roll_error(self) -> bool:
+        if self.error_rate <= 0:
+            return False
+        with self._lock:
+            return self._rng.random() < self.error_rate
+
+
+def config_from_env() -> TransportConfig:
+    latency = os.environ.get("TOURBOARD_REPLAY_LATENCY", "0")
+    seed = os.environ.get("TOURBOARD_REPLAY_SEED")
+    return TransportConfig(
+        mode=os.environ.get("TOURBOARD_TRANSPORT", "live"),
+        cassette_dir=Path(os.environ.get("TOURBOARD_CASSETTES", CASSETTE_DIR)),
+        latency=0.0 if latency == "recorded" else float(latency),
+        recorded_latency=latency == "recorded",
+        error_rate=float(os.environ.get("TOURBOARD_REPLAY_ERROR_RATE", "0")),
+        error_kind=os.environ.get("TOURBOARD_REPLAY_ERROR_KIND", "connection"),
+        seed=int(seed) if seed else None,
+    )
+
+
+_config: Optional[TransportConfig] = None
+_default_session = None
+_state_lock = threading.Lock()
+
+
+def get_config() -> TransportConfig:
+    global _config
+    with _state_lock:
+        if _config is None:
+            _config = config_from_env()
+        return _config
+
+
+def configure(**kwargs) -> TransportConfig:
+    """Override the environment config, e.g. configure(mode="replay", latency=0.2)."""
+    global _config, _default_session
+    with _state_lock:
+        _config = TransportConfig(**kwargs)
+        _default_session = None
+        return _config
+
+
+def cassette_path(cassette_dir: Path, url: str) -> Path:
+    host = urlsplit(url).netloc.lower() or "_"
+    digest = hashlib.sha256(f"GET {url}".encode("utf-8")).hexdigest()
+    return cassette_dir / host / f"{digest[:32]}.json.gz"
+
+
+def _full_url(url: str, params) -> str:
+    if not params:
+        return url
+    return requests.Request("GET", url, params=params).prepare().url
+
+
+class RecordingSession:
+    """Live session that also writes every response to the cassette dir."""
+
+    def __init__(self, session: requests.Session, config: TransportConfig):
+        self.session = session
+        self.config = config
+
+    def get(self, url, params=None, **kwargs) -> requests.Response:
+        full = _full_url(url, params)
+        r = self.session.get(full, **kwargs)
+        if r.status_code == 304:
+            # keep the full body we recorded earlier; replay answers 304 itself
+            return r
+        path = cassette_path(self.config.cassette_dir, full)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        record = {
+            "url": full,
+            "status_code": r.status_code,
+            "reason": r.reason,
+            "headers": dict(r.headers),
+            "encoding": r.encoding,
+            "elapsed_s": r.elapsed.total_seconds(),
+            "body_b64": base64.b64encode(r.content).decode("ascii"),
+        }
+        tmp = path.with_suffix(f".{threading.get_ident()}.tmp")
+        tmp.write_bytes(gzip.compress(json.dumps(record).encode("utf-8"), mtime=0))
+        os.replace(tmp, path)
+        return r
+
+    def close(self) -> None:
+        self.session.close()
+
+    def __getattr__(self, name):
+        return getattr(self.session, name)
+
+
+class ReplaySession:
+    """Serves recorded responses, with optional latency and error injection."""
+
+    def __init__(self, config: TransportConfig):
+        self.config = config
+        self.headers = CaseInsensitiveDict()
+
+    def get(self, url, params=None, headers=None, timeout=None, **kwargs) -> requests.Response:
+        full = _full_url(url, params)
+        path = cassette_path(self.config.cassette_dir, full)
+        if not path.exists():
+            raise CassetteMiss(f"No cassette for {full} in {self.config.cassette_dir}")
+        record = json.loads(gzip.decompress(path.read_bytes()))
+
+        delay = record["elapsed_s"] if self.config.recorded_latency else self.config.latency
+        if delay > 0:
+            time.sleep(delay)
+
+        if self.config.roll_error():
+            kind = self.config.error_kind
+            if kind == "connection":
+                raise requests.ConnectionError(f"Injected connection error for {full}")
+            if kind == "timeout":
+                raise requests.ReadTimeout(f"Injected timeout for {full}")
+            record = dict(record, status_code=503, reason="Service Unavailable", body_b64="", headers={})
+        elif _not_modified(record, headers or {}):
+            record = dict(record, status_code=304, reason="Not Modified", body_b64="")
+
+        r = requests.Response()
+        r.url = record["url"]
+        r.status_code = record["status_code"]
+        r.reason = record.get("reason")
+        r.headers = CaseInsensitiveDict(record["headers"])
+        r.encoding = record.get("encoding")
+        r._content = base64.b64decode(record["body_b64"])
+        r.elapsed = timedelta(seconds=delay)
+        r.request = requests.Request("GET", full, headers=headers).prepare()
+        return r
+
+    def close(self) -> None:
+        pass
+
+
+def _not_modified(record: dict, headers: dict) -> bool:
+    rec_headers = CaseInsensitiveDict(record["headers"])
+    req = CaseInsensitiveDict(headers)
+    etag = rec_headers.get("ETag")
+    if etag and req.get("If-None-Match") == etag:
+        return True
+    modified = rec_headers.get("Last-Modified")
+    return bool(modified) and "If-None-Match" not in req and req.get("If-Modified-Since") == modified
+
+
+def wrap(session: requests.Session):
+    """Put a session behind the configured transport mode."""
+    config = get_config()
+    if config.mode == "record":
+        return RecordingSession(session, config)
+    if config.mode == "replay":
+        session.close()
+        return ReplaySession(config)
+    return session
+
+
+def make_session(pool_size: int = 16, retries: int = 2) -> requests.Session:
+    """Keep-alive session with a connection pool sized for the worker count."""
+    retry = Retry(
+        total=retries,
+        backoff_factor=0.5,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=("GET",),
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    s = requests.Session()
+    s.mount("https://", adapter)
+    s.mount("http://", adapter)
+    return s
+
+
+def new_session(pool_size: int = 16, retries: int = 2):
+    return wrap(make_session(pool_size, retries))
+
+
+def default_session():
+    """Process-wide session for one-off requests."""
+    global _default_session
+    if _default_session is None:
+        s = new_session()
+        with _state_lock:
+            if _default_session is None:
+                _default_session = s
+            else:
+                s.close()
+    return _default_session